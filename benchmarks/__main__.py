@@ -0,0 +1,97 @@
+"""
+Run the benchmark suite.
+
+    python -m benchmarks [--json FILE] [--compare FILE] [--threshold RATIO] [BENCHMARK ...]
+
+With --json the results are written as JSON, together with the versions they were measured with.
+With --compare the timings are compared to such a file, and the exit status is 1 if any benchmark got
+slower than the threshold ratio.
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+
+import tri_token
+
+from benchmarks.harness import format_result
+
+BENCHMARKS = [
+    'construction',
+    'containers',
+    'validate',
+    'pydantic',
+    'pickle',
+    'codes',
+    'export',
+    'memory',
+    'lazy',
+    'sets',
+    'maps',
+    'profiling',
+    'records',
+    'catalog',
+]
+
+
+def run(names):
+    results = []
+    for name in names:
+        module = importlib.import_module(f'benchmarks.bench_{name}')
+        for result in module.run():
+            results.append(dict(result, benchmark=name))
+            print(format_result(result, 50), flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    baseline = {(r['benchmark'], r['name']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = baseline.get((result['benchmark'], result['name']))
+        if before is None:
+            continue
+        key = 'seconds' if 'seconds' in result else 'bytes'
+        ratio = result[key] / before[key] if before[key] else 1.0
+        marker = '  <-- regression' if ratio > threshold else ''
+        print(f"{result['name']:<50}  {ratio:6.2f}x{marker}")
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the tri.token benchmarks')
+    parser.add_argument('benchmarks', nargs='*', help=f'Benchmarks to run, of {", ".join(BENCHMARKS)} (default all)')
+    parser.add_argument('--json', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Compare timings to results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slow down ratio counted as a regression')
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    results = run(args.benchmarks or BENCHMARKS)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(
+                tri_token=tri_token.__version__,
+                python=sys.version,
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                results=results,
+            ), f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Looking tokens up in a memory mapped catalog against creating the container in each process.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+from tri_token.catalog import (
+    Catalog,
+    write_catalog,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class CatalogToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+    url = TokenAttribute(value=lambda name, code, **_: f'https://example.com/tokens/{code}/{name}/')
+
+
+def make_container(count):
+    return TokenContainerMeta('CatalogTokens', (TokenContainer,), {
+        f'token_{i}': CatalogToken(code=i) for i in range(count)
+    })
+
+
+def private_bytes():
+    """
+    Memory of this process not shared with others, e.g. not the pages of a mapped file, where Linux tells
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            return sum(int(line.split()[1]) * 1024 for line in f if line.startswith(('Private_Clean', 'Private_Dirty')))
+    except OSError:  # pragma: no cover
+        return None
+
+
+def run(count=20_000):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'tokens.catalog')
+        container = make_container(count)
+        results = [
+            measure(f'write_catalog, {count} tokens', lambda: write_catalog(path, [container]), number=1, repeat=3),
+        ]
+
+        def attach():
+            Catalog(path).close()
+
+        with Catalog(path) as catalog:
+            tokens = catalog[container]
+            results += [
+                measure('Catalog(path)', attach),
+                measure('container.tokens[name]', lambda: container.tokens['token_12345']),
+                measure('catalog ordinal(name)', lambda: tokens.ordinal('token_12345')),
+                measure('catalog value(ordinal, attribute)', lambda: tokens.value(12345, 'url')),
+                measure('catalog record(name)', lambda: tokens.record('token_12345')),
+            ]
+
+        del container
+        gc.collect()
+        before = private_bytes()
+        if before is not None:
+            container = make_container(count)
+            built = private_bytes() - before
+            del container
+            gc.collect()
+
+            before = private_bytes()
+            with Catalog(path) as catalog:
+                [tokens] = catalog.containers.values()
+                for i in range(0, count, 7):
+                    tokens.value(f'token_{i}', 'url')
+                attached = private_bytes() - before
+            results += [
+                dict(name=f'private memory, create {count} tokens', bytes=built),
+                dict(name=f'private memory, look up in catalog of {count} tokens', bytes=attached),
+            ]
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,47 @@
+"""
+Integer codes for token valued columns: encode/decode speed and the memory of codes against lists of tokens.
+"""
+import sys
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class CodedToken(Token):
+    code = TokenAttribute()
+
+
+def run(token_count=1000, column_length=1_000_000):
+    container = TokenContainerMeta('CodedTokens', (TokenContainer,), {
+        f'token_{i}': CodedToken(code=i) for i in range(token_count)
+    })
+    tokens = list(container)
+    column = [tokens[(i * 7919) % token_count] for i in range(column_length)]
+    codes = container.encode(column)
+
+    results = [
+        measure(f'encode {column_length} tokens', lambda: container.encode(column), repeat=3),
+        measure(f'decode {column_length} codes', lambda: container.decode(codes), repeat=3),
+        dict(name=f'bytes for {column_length} tokens (list)', bytes=sys.getsizeof(column)),
+        dict(name=f'bytes for {column_length} tokens (codes)', bytes=sys.getsizeof(codes)),
+    ]
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        return results
+    array_codes = numpy.frombuffer(codes, dtype=codes.typecode)
+    results.append(measure(f'decode {column_length} codes (numpy)', lambda: container.decode(array_codes), repeat=3))
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
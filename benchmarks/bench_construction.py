@@ -0,0 +1,49 @@
+"""
+Token construction: the generated per class constructor against the generic Token.__init__.
+"""
+from tri_token import (
+    PRESENT,
+    Token,
+    TokenAttribute,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class PlainToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute()
+    description = TokenAttribute(default='')
+
+
+class DerivedToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+    url = TokenAttribute(optional_value=lambda name, **_: f'/tokens/{name}/')
+
+
+class GenericPlainToken(PlainToken):
+    # Defining __init__ opts out of the generated constructor
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+class GenericDerivedToken(DerivedToken):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+def run():
+    return [
+        measure('construct plain (generic)', lambda: GenericPlainToken(code=1, label='One')),
+        measure('construct plain (generated)', lambda: PlainToken(code=1, label='One')),
+        measure('construct derived (generic)', lambda: GenericDerivedToken(PRESENT('url'), name='some_name', code=1)),
+        measure('construct derived (generated)', lambda: DerivedToken(PRESENT('url'), name='some_name', code=1)),
+    ]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,81 @@
+"""
+Container class creation, lookups, iteration, hashing, equality and sorting.
+"""
+import random
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class BenchmarkToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+
+
+class IndexedToken(Token):
+    code = TokenAttribute()
+    parity = TokenAttribute()
+
+
+def make_container(count):
+    return TokenContainerMeta(f'Tokens{count}', (TokenContainer,), {
+        f'token_{i}': BenchmarkToken(code=i) for i in range(count)
+    })
+
+
+def run_creation(sizes=(10, 100, 1_000, 10_000, 100_000)):
+    return [
+        measure(f'create container with {size} tokens', lambda size=size: make_container(size), number=1 if size >= 10_000 else None, repeat=3)
+        for size in sizes
+    ]
+
+
+def run_lookups(count=1_000):
+    container = make_container(count)
+    tokens = list(container)
+    name = f'token_{count // 2}'
+    token = container[name]
+    other = tokens[0]
+    shuffled = random.Random(0).sample(tokens, len(tokens))
+    by_label = lambda token: token.label
+    indexed = TokenContainerMeta(f'IndexedTokens{count}', (TokenContainer,), {
+        'Meta': type('Meta', (), dict(unique_indexes=['code'], indexes=['parity'])),
+        **{f'token_{i}': IndexedToken(code=i, parity=i % 2) for i in range(count)},
+    })
+    return [
+        measure(f'__getitem__ ({count} tokens)', lambda: container[name]),
+        measure(f'get ({count} tokens)', lambda: container.get(name)),
+        measure(f'get missing ({count} tokens)', lambda: container.get('missing')),
+        measure(f'__contains__ ({count} tokens)', lambda: token in container),
+        measure(f'iterate ({count} tokens)', lambda: list(container)),
+        measure('hash', lambda: hash(token)),
+        measure('== same', lambda: token == token),
+        measure('== other', lambda: token == other),
+        measure('dict lookup by token', lambda d={token: 1}: d[token]),
+        measure(f'sorted ({count} tokens)', lambda: sorted(shuffled)),
+        measure(f'set of all ({count} tokens)', lambda: set(tokens)),
+        measure(f'scan by attribute ({count} tokens)', lambda: [t for t in container if t.code == count // 2]),
+        measure(f'by unique index ({count} tokens)', lambda: indexed.by('code', count // 2)),
+        measure(f'by index ({count} tokens)', lambda: indexed.by('parity', 1)),
+        measure(f'filter two indexes ({count} tokens)', lambda: indexed.filter(parity=1, code=count // 2 + 1)),
+        measure(f'ordered ({count} tokens)', lambda: container.ordered()),
+        measure(f'ordered by sort key ({count} tokens)', lambda key=by_label: container.ordered(key)),
+        measure(f'in_documentation_order by sort key ({count} tokens)', lambda key=by_label: container.in_documentation_order(key)),
+    ]
+
+
+def run():
+    return run_creation() + run_lookups()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,68 @@
+"""
+Documentation exporters.
+"""
+import os
+import tracemalloc
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class DocumentedToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+    description = TokenAttribute(default='Some description of the token, with `markup` *characters*')
+
+
+def peak_bytes(function):
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(count=1_000):
+    container = TokenContainerMeta('DocumentedTokens', (TokenContainer,), {
+        'Meta': type('Meta', (), dict(documentation_columns=['name', 'label', 'description'])),
+        **{f'token_{i}': DocumentedToken(code=str(i)) for i in range(count)},
+    })
+    results = [
+        measure(f'to_csv ({count} tokens)', container.to_csv, repeat=3),
+        measure(f'to_confluence ({count} tokens)', container.to_confluence, repeat=3),
+        measure(f'to_rst ({count} tokens)', container.to_rst, repeat=3),
+    ]
+    with open(os.devnull, 'w') as devnull:
+        results.append(measure(f'write_rst ({count} tokens)', lambda: container.write_rst(devnull), repeat=3))
+        for tokens in (count, count * 10):
+            large = TokenContainerMeta('DocumentedTokens', (container,), {
+                f'token_{i}': DocumentedToken(code=str(i)) for i in range(count, tokens)
+            })
+            results.append(dict(name=f'peak memory to_rst ({tokens} tokens)', bytes=peak_bytes(large.to_rst)))
+            results.append(dict(name=f'peak memory write_rst ({tokens} tokens)', bytes=peak_bytes(lambda: large.write_rst(devnull))))
+    results.append(measure(f'to_columns ({count} tokens)', container.to_columns, repeat=3))
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        results.append(measure(f'to_arrow ({count} tokens)', container.to_arrow, repeat=3))
+    try:
+        import xlwt  # noqa: F401
+    except ImportError:  # pragma: no cover
+        return results
+    results.append(measure(f'to_excel ({count} tokens)', container.to_excel, repeat=3))
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,62 @@
+"""
+Creating containers with derived attributes: eager derivation against `lazy_derived_attributes`.
+"""
+import gc
+import tracemalloc
+
+from tri_token import (
+    PRESENT,
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class DerivedToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+    url = TokenAttribute(value=lambda name, code, **_: f'https://example.com/tokens/{code}/{name}/')
+    lookup_key = TokenAttribute(optional_value=lambda name, code, **_: f'{name.upper()}-{code:08d}')
+
+
+def make_container(count, lazy):
+    return TokenContainerMeta('DerivedTokens', (TokenContainer,), {
+        'Meta': type('Meta', (), dict(lazy_derived_attributes=lazy)),
+        **{f'token_{i}': DerivedToken(PRESENT('lookup_key'), code=i) for i in range(count)},
+    })
+
+
+def bytes_per_token(count, lazy):
+    gc.collect()
+    tracemalloc.start()
+    container = make_container(count, lazy)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(container) == count
+    return size / count
+
+
+def run(count=10_000):
+    eager = make_container(1000, lazy=False)
+    token = eager.token_500
+    lazy = make_container(1000, lazy=True)
+    lazy_token = lazy.token_500
+    lazy_token.label
+    return [
+        measure(f'create {count} tokens (eager)', lambda: make_container(count, lazy=False), number=1, repeat=3),
+        measure(f'create {count} tokens (lazy)', lambda: make_container(count, lazy=True), number=1, repeat=3),
+        dict(name=f'bytes per token, {count} tokens (eager)', bytes=bytes_per_token(count, lazy=False)),
+        dict(name=f'bytes per token, {count} tokens (lazy)', bytes=bytes_per_token(count, lazy=True)),
+        measure('read derived attribute (eager)', lambda: token.label),
+        measure('read derived attribute (lazy, derived)', lambda: lazy_token.label),
+    ]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,55 @@
+"""
+Mappings keyed by container tokens: TokenMap against dict.
+
+A dict calls Token.__hash__ for every lookup, TokenMap indexes a list by the ordinal stored on the token. Reading is
+about as fast as with a dict, setting and so counting is faster (about 6 against 8 ms for 10k tokens). Iterating a
+TokenMap with a value for every token zips the tokens and the values and takes about as long as iterating the dict,
+missing keys make it slower. Pickles are several times smaller.
+"""
+import pickle
+
+from tri_token import TokenMap
+
+from benchmarks.bench_sets import FlagTokens
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+def count(counts, tokens):
+    for token in tokens:
+        counts[token] += 1
+
+
+def run():
+    tokens = list(FlagTokens)
+    token = tokens[500]
+    stream = tokens * 10
+
+    kinds = [
+        ('dict', lambda: dict.fromkeys(tokens, 0)),
+        ('TokenMap', lambda: TokenMap(FlagTokens, dict.fromkeys(tokens, 0))),
+    ]
+    try:
+        import numpy  # noqa: F401
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        kinds.append(('TokenMap int64', lambda: TokenMap(FlagTokens, dtype='int64')))
+
+    results = []
+    for kind, make in kinds:
+        counts = make()
+        results += [
+            measure(f'getitem ({kind})', lambda counts=counts: counts[token]),
+            measure(f'setitem ({kind})', lambda counts=counts: counts.__setitem__(token, 1)),
+            measure(f'count 10k tokens ({kind})', lambda counts=counts: count(counts, stream), repeat=3),
+            measure(f'iterate items ({kind})', lambda counts=counts: list(counts.items())),
+            dict(name=f'pickled size ({kind})', bytes=len(pickle.dumps(counts, pickle.HIGHEST_PROTOCOL))),
+        ]
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
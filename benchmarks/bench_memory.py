@@ -0,0 +1,74 @@
+"""
+Memory per token: the default instance __dict__ layout against `__compact__ = True` (__slots__).
+"""
+import gc
+import pickle
+import tracemalloc
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainerMeta,
+    TokenContainer,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class DictToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute()
+    description = TokenAttribute()
+    prefix = TokenAttribute()
+
+
+class CompactToken(Token):
+    __compact__ = True
+
+    code = TokenAttribute()
+    label = TokenAttribute()
+    description = TokenAttribute()
+    prefix = TokenAttribute()
+
+
+def make_container(token_class, count):
+    tokens = {
+        f'token_{i}': token_class(code=i, label='Label', description='Description')
+        for i in range(count)
+    }
+    return TokenContainerMeta(f'{token_class.__name__}s', (TokenContainer,), tokens)
+
+
+def bytes_per_token(token_class, count):
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    container = make_container(token_class, count)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(container) == count
+    return (after - before) / count
+
+
+def run(count=50_000):
+    results = []
+    for token_class in (DictToken, CompactToken):
+        results.append(dict(
+            name=f'bytes per token ({token_class.__name__})',
+            bytes=bytes_per_token(token_class, count),
+        ))
+        container = make_container(token_class, 1000)
+        token = container.token_500
+        results.append(measure(f'attribute read ({token_class.__name__})', lambda: token.label))
+        results.append(measure(f'hash ({token_class.__name__})', lambda: hash(token)))
+        results.append(measure(f'str ({token_class.__name__})', lambda: str(token)))
+        results.append(measure(f'repr ({token_class.__name__})', lambda: repr(token)))
+        results.append(measure(f'pickle round trip ({token_class.__name__})', lambda: pickle.loads(pickle.dumps(token))))
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,67 @@
+"""
+Pickling tokens by reference to their container against pickling their full state.
+
+Run as a module so the container below is importable: python -m benchmarks.bench_pickle
+"""
+import io
+import pickle
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class PickledToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute()
+    description = TokenAttribute()
+
+
+PickledTokens = TokenContainerMeta('PickledTokens', (TokenContainer,), {
+    '__module__': __name__,
+    **{
+        f'token_{i}': PickledToken(code=i, label=f'Label {i}', description='A description of the token')
+        for i in range(1000)
+    },
+})
+
+
+class StatePickler(pickle.Pickler):
+    # How tokens were pickled before they were pickled by reference
+    def reducer_override(self, obj):
+        if isinstance(obj, Token):
+            return object.__reduce_ex__(obj, pickle.HIGHEST_PROTOCOL)
+        return NotImplemented
+
+
+def dumps_state(obj):
+    out = io.BytesIO()
+    StatePickler(out, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return out.getvalue()
+
+
+def run(count=10_000):
+    tokens = [PickledTokens.tokens[f'token_{i % 1000}'] for i in range(count)]
+    by_reference = pickle.dumps(tokens, pickle.HIGHEST_PROTOCOL)
+    by_state = dumps_state(tokens)
+    assert pickle.loads(by_reference)[0] is tokens[0]
+    return [
+        dict(name=f'payload {count} tokens (state)', bytes=len(by_state)),
+        dict(name=f'payload {count} tokens (reference)', bytes=len(by_reference)),
+        measure(f'dumps {count} tokens (state)', lambda: dumps_state(tokens), repeat=3),
+        measure(f'dumps {count} tokens (reference)', lambda: pickle.dumps(tokens, pickle.HIGHEST_PROTOCOL), repeat=3),
+        measure(f'loads {count} tokens (state)', lambda: pickle.loads(by_state), repeat=3),
+        measure(f'loads {count} tokens (reference)', lambda: pickle.loads(by_reference), repeat=3),
+    ]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,33 @@
+"""
+Cost of profiling: container creation and validation with profiling disabled and enabled.
+"""
+from tri_token import (
+    disable_profiling,
+    enable_profiling,
+)
+
+from benchmarks.bench_containers import make_container
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+def run(count=1_000):
+    container = make_container(count)
+    results = []
+    for state in ('disabled', 'enabled'):
+        if state == 'enabled':
+            enable_profiling()
+        try:
+            results += [
+                measure(f'create container with {count} tokens (profiling {state})', lambda: make_container(count), repeat=3),
+                measure(f'_validate (profiling {state})', lambda: container._validate('token_1')),
+            ]
+        finally:
+            disable_profiling()
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,81 @@
+"""
+Coercion of token names through pydantic models, and JSON schema generation.
+
+With pydantic v2 the core schema lookup is compared with a plain validator calling Token._validate, the path
+pydantic v1 takes.
+"""
+import json
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class ModelToken(Token):
+    code = TokenAttribute()
+
+
+ModelTokens = TokenContainerMeta('ModelTokens', (TokenContainer,), {
+    f'token_{i}': ModelToken(code=i) for i in range(1000)
+})
+
+
+def run(rows=10_000):
+    try:
+        import pydantic
+    except ImportError:  # pragma: no cover
+        return []
+
+    class Row(pydantic.BaseModel):
+        token: ModelToken
+        amount: int
+
+    json_schema = getattr(Row, 'model_json_schema', None) or Row.schema
+    data = [dict(token=f'token_{i % 1000}', amount=i) for i in range(rows)]
+    results = [
+        measure('Token._validate', lambda: ModelToken._validate('token_500')),
+        measure(f'pydantic model from {rows} rows', lambda: [Row(**row) for row in data], repeat=3),
+        measure('__modify_schema__ (1000 tokens)', lambda: ModelToken.__modify_schema__({})),
+        dict(name='pattern length (1000 tokens)', bytes=len(json_schema()['properties']['token']['pattern'])),
+    ]
+    if not pydantic.VERSION.startswith('1.'):
+        results += _run_v2(pydantic, Row, data)
+    return results
+
+
+def _run_v2(pydantic, Row, data):
+    from typing import (
+        Annotated,
+        List,
+    )
+
+    class ValidateRow(pydantic.BaseModel):
+        token: Annotated[ModelToken, pydantic.PlainValidator(ModelToken._validate)]
+        amount: int
+
+    rows = len(data)
+    instances = [dict(token=ModelTokens[row['token']], amount=row['amount']) for row in data]
+    data_json = json.dumps(data)
+    results = []
+    for label, model in [('core schema', Row), ('_validate', ValidateRow)]:
+        adapter = pydantic.TypeAdapter(List[model])
+        results += [
+            measure(f'v2 {label}: {rows} rows of names', lambda: adapter.validate_python(data), repeat=3),
+            measure(f'v2 {label}: {rows} rows of tokens', lambda: adapter.validate_python(instances), repeat=3),
+            measure(f'v2 {label}: {rows} rows of JSON', lambda: adapter.validate_json(data_json), repeat=3),
+        ]
+    adapter = pydantic.TypeAdapter(List[Row])
+    models = adapter.validate_python(data)
+    results.append(measure(f'v2 core schema: {rows} rows to JSON', lambda: adapter.dump_json(models), repeat=3))
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
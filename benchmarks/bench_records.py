@@ -0,0 +1,60 @@
+"""
+Containers built from a CSV file: from the records each time against a warm from_csv cache.
+
+A warm cache skips parsing and derivation, but the tokens are still created and bound to the container, with their
+hashes, qualified names and reprs computed when they are frozen. With 20k tokens a warm load takes about half the time
+of a cold one, 0.6-0.75 s against 1.1-1.3 s.
+"""
+import csv
+import shutil
+import tempfile
+from pathlib import Path
+
+from tri_token import (
+    PRESENT,
+    Token,
+    TokenAttribute,
+    TokenContainer,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class RecordToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.replace('_', ' ').title())
+    url = TokenAttribute(value=lambda name, code, **_: f'https://example.com/tokens/{code}/{name}/')
+    lookup_key = TokenAttribute(optional_value=lambda name, code, **_: f'{name.upper()}-{code}')
+
+
+def run(count=20_000):
+    directory = Path(tempfile.mkdtemp())
+    try:
+        path = directory / 'tokens.csv'
+        with open(path, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(['name', 'code'])
+            w.writerows([f'token_{i}', f'{i:08d}'] for i in range(count))
+
+        # PRESENT can not be written to CSV, so the optional lookup_key is only derived for the records
+        records = [
+            dict(name=f'token_{i}', code=f'{i:08d}', lookup_key=PRESENT if i % 2 else None)
+            for i in range(count)
+        ]
+        cache_dir = directory / 'cache'
+        TokenContainer.from_csv('RecordTokens', RecordToken, path, cache_dir=cache_dir)
+        return [
+            measure(f'from_records, {count} tokens', lambda: TokenContainer.from_records('RecordTokens', RecordToken, records), number=1, repeat=3),
+            measure(f'from_csv, {count} tokens (no cache)', lambda: TokenContainer.from_csv('RecordTokens', RecordToken, path), number=1, repeat=3),
+            measure(f'from_csv, {count} tokens (warm cache)', lambda: TokenContainer.from_csv('RecordTokens', RecordToken, path, cache_dir=cache_dir), number=1, repeat=3),
+            dict(name=f'cache file size, {count} tokens', bytes=sum(p.stat().st_size for p in cache_dir.iterdir())),
+        ]
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,57 @@
+"""
+Sets of container tokens: TokenSet bitmasks against frozensets.
+"""
+import pickle
+import random
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+    TokenSet,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class FlagToken(Token):
+    code = TokenAttribute()
+
+
+FlagTokens = TokenContainerMeta('FlagTokens', (TokenContainer,), {
+    '__module__': __name__,
+    **{f'flag_{i}': FlagToken(code=i) for i in range(1_000)},
+})
+
+
+def run():
+    rng = random.Random(0)
+    tokens = list(FlagTokens)
+    first = rng.sample(tokens, 300)
+    second = rng.sample(tokens, 300)
+    token = first[0]
+
+    results = []
+    for kind, make in (('frozenset', frozenset), ('TokenSet', lambda tokens: TokenSet(FlagTokens, tokens))):
+        a, b = make(first), make(second)
+        results += [
+            measure(f'create from 300 tokens ({kind})', lambda make=make: make(first)),
+            measure(f'union ({kind})', lambda a=a, b=b: a | b),
+            measure(f'intersection ({kind})', lambda a=a, b=b: a & b),
+            measure(f'difference ({kind})', lambda a=a, b=b: a - b),
+            measure(f'contains ({kind})', lambda a=a: token in a),
+            measure(f'iterate ({kind})', lambda a=a: list(a)),
+            # A new set is iterated the first time
+            measure(f'iterate an intersection ({kind})', lambda a=a, b=b: list(a & b)),
+            measure(f'iterate an intersection with 10 tokens ({kind})', lambda a=a, c=make(first[:10]): list(a & c)),
+            dict(name=f'pickled size ({kind})', bytes=len(pickle.dumps(a, pickle.HIGHEST_PROTOCOL))),
+        ]
+    return results
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
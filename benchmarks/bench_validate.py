@@ -0,0 +1,69 @@
+"""
+String coercion through Token._validate: the per class name index against scanning every registered container.
+Name resolution: case folded and qualified lookups, prefix queries and suggestions.
+"""
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+from benchmarks.harness import (
+    measure,
+    report,
+)
+
+
+class ValidatedToken(Token):
+    code = TokenAttribute()
+
+
+def make_containers(container_count, tokens_per_container):
+    return [
+        TokenContainerMeta(f'Container{c}', (TokenContainer,), {
+            f'token_{c}_{i}': ValidatedToken(code=i)
+            for i in range(tokens_per_container)
+        })
+        for c in range(container_count)
+    ]
+
+
+def scan_containers(cls, value):
+    # The lookup Token._validate did before the name index
+    for container in cls._container_classes:
+        token = container.get(value)
+        if token is not None:
+            return token
+    raise ValueError(f"{value} is not a valid value for {cls.__name__}")
+
+
+def scan_folded(cls, value):
+    folded = value.casefold()
+    for container in cls._container_classes:
+        for token in container:
+            if token.name.casefold() == folded:
+                return token
+
+
+def run(container_count=50, tokens_per_container=100):
+    make_containers(container_count, tokens_per_container)
+    value = f'token_{container_count - 1}_0'
+    assert scan_containers(ValidatedToken, value) is ValidatedToken._validate(value)
+    folded = value.upper()
+    assert scan_folded(ValidatedToken, folded) is ValidatedToken.resolve(folded)
+    column = [f'token_{i % container_count}_{i % tokens_per_container}' for i in range(100_000)]
+    return [
+        measure(f'_validate {container_count} containers (scan)', lambda: scan_containers(ValidatedToken, value)),
+        measure(f'_validate {container_count} containers (index)', lambda: ValidatedToken._validate(value)),
+        measure('100k column (_validate per value)', lambda: [ValidatedToken._validate(v) for v in column], repeat=3),
+        measure('100k column (validate_many)', lambda: ValidatedToken.validate_many(column), repeat=3),
+        measure(f'resolve case folded, {container_count} containers (scan)', lambda: scan_folded(ValidatedToken, folded)),
+        measure(f'resolve case folded, {container_count} containers (index)', lambda: ValidatedToken.resolve(folded)),
+        measure(f'with_prefix, {container_count} containers', lambda: ValidatedToken.with_prefix(f'token_{container_count - 1}_9')),
+        measure(f'suggest, {container_count} containers', lambda: ValidatedToken.suggest('tokn_1_1'), repeat=3),
+    ]
+
+
+if __name__ == '__main__':  # pragma: no cover
+    report(run())
@@ -0,0 +1,38 @@
+"""
+Minimal timing helpers shared by the benchmark modules.
+
+Every benchmark module has a `run()` function returning a list of results, each a dict with a `name` and
+either `seconds` (best time per call) or `bytes`. Run a single module from the repository root with e.g.::
+
+    python -m benchmarks.bench_construction
+
+or all of them, optionally writing the results as JSON, with::
+
+    python -m benchmarks --json results.json
+"""
+import timeit
+
+
+def measure(name, function, number=None, repeat=5):
+    """
+    Time `function` and return the best time per call in seconds.
+
+    When `number` is not given it is picked so that one repetition takes at least 0.2 seconds.
+    """
+    timer = timeit.Timer(function)
+    if number is None:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return dict(name=name, seconds=best, number=number, repeat=repeat)
+
+
+def format_result(result, width):
+    if 'bytes' in result:
+        return f"{result['name']:<{width}}  {result['bytes']:14.1f} bytes"
+    return f"{result['name']:<{width}}  {result['seconds'] * 1e6:14.3f} us"
+
+
+def report(results):
+    width = max(len(result['name']) for result in results)
+    for result in results:
+        print(format_result(result, width))
@@ -1,10 +1,42 @@
+import atexit
 import csv
-from collections.abc import Hashable
+import json
+import os
+import pickle
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from difflib import get_close_matches
+from heapq import nlargest
+from itertools import (
+    compress,
+    repeat,
+)
+from operator import (
+    attrgetter,
+    is_not,
+)
+from threading import RLock
+from collections.abc import (
+    Hashable,
+    ItemsView,
+    MutableMapping,
+    Set,
+    ValuesView,
+)
+from contextlib import nullcontext
 from dataclasses import dataclass
+from hashlib import sha256
 from io import (
+    BufferedIOBase,
     BytesIO,
+    RawIOBase,
     StringIO,  # pragma: no cover
+    TextIOWrapper,
 )
+from tempfile import NamedTemporaryFile
 from typing import Any
 
 from tri_declarative import (
@@ -12,8 +44,13 @@ from tri_declarative import (
     with_meta,
 )
 
+from tri_token.profiling import Profile
+
 __version__ = '4.0.0'
 
+# The Profile being collected, or None when profiling is disabled
+_profile = None
+
 
 class PRESENT(object):
     def __init__(self, attribute_name):
@@ -31,9 +68,261 @@ class TokenAttribute:
     optional_value: Any = None
     default: Any = MISSING
 
+    def __get__(self, instance, owner):
+        # Values live on the token instances. A token without a value for the attribute gets an
+        # AttributeError, and Token.__getattr__ a chance to derive it, instead of the declaration.
+        if instance is None:
+            return self
+        raise AttributeError(f"'{type(instance).__name__}' object has no value for a token attribute")
+
+
+def _apply_present_arguments(args, kwargs):
+    for arg in args:
+        if isinstance(arg, PRESENT):
+            assert arg.attribute_name not in kwargs, f"{arg.attribute_name} used with PRESENT and kwarg at the same time"
+            kwargs[arg.attribute_name] = PRESENT
+        else:  # pragma: no cover
+            assert False, f"Unexpected position argument: {arg}"  # pragma: no mutate
+
+
+def _unhashable_attribute_error(name, value):
+    return ValueError(f"Attribute {name} has unhashable value: {value}")
+
+
+def _validate_many(values, validate):
+    """
+    Coerce all `values` with `validate`, resolving each distinct value only once.
+
+    Returns a list, or an object array when given a NumPy array. All invalid values
+    are reported together in one ValueError.
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        if values.dtype.kind in 'US':
+            uniques, inverse = numpy.unique(values, return_inverse=True)
+            lookup = numpy.empty(len(uniques), dtype=object)
+            lookup[:] = _validate_many(uniques.tolist(), validate)
+            return lookup[inverse].reshape(values.shape)
+        result = numpy.empty(values.shape, dtype=object)
+        result.flat[:] = _validate_many(values.ravel().tolist(), validate)
+        return result
+
+    errors = {}  # Used as an ordered set of error messages
+
+    def validate_or_record_error(value):
+        try:
+            return validate(value)
+        except ValueError as e:
+            errors[str(e)] = None
+            return None
+
+    resolved = {}
+    result = []
+    for value in values:
+        try:
+            token = resolved[value]
+        except KeyError:
+            token = resolved[value] = validate_or_record_error(value)
+        except TypeError:
+            # Unhashable, so not a token or a name, but let validate tell what is wrong with it
+            token = validate_or_record_error(value)
+        result.append(token)
+
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return result
+
+
+class _NameIndex:
+    """
+    Tokens by name, by qualified name (prefix.name, as given by str()) and by case folded name, with the case folded
+    names also sorted for prefix queries. A name that maps to different tokens does not resolve.
+    """
+
+    def __init__(self, tokens):
+        self.tokens_by_name = {}
+        self.tokens_by_folded_name = {}
+        for token in tokens:
+            names = {token.name, str(token)}
+            # Dicts as ordered sets, a token inherited by several containers is still one token
+            for name in names:
+                self.tokens_by_name.setdefault(name, {})[token] = None
+            for folded_name in {name.casefold() for name in names}:
+                self.tokens_by_folded_name.setdefault(folded_name, {})[token] = None
+        self.folded_names = sorted(self.tokens_by_folded_name)
+        # Folded names by the character pairs in them, built by the first suggest() on a large index
+        self.names_by_bigram = None
+
+    def resolve(self, name):
+        tokens = self.tokens_by_name.get(name) or self.tokens_by_folded_name.get(name.casefold())
+        if tokens and len(tokens) == 1:
+            return next(iter(tokens))
+        return None
+
+    def with_prefix(self, prefix):
+        prefix = prefix.casefold()
+        result = {}
+        for i in range(bisect_left(self.folded_names, prefix), len(self.folded_names)):
+            folded_name = self.folded_names[i]
+            if not folded_name.startswith(prefix):
+                break
+            result.update(self.tokens_by_folded_name[folded_name])
+        return tuple(result)
+
+    def suggest(self, name, count):
+        name = name.casefold()
+        candidates = self.folded_names
+        if len(candidates) > _SUGGEST_CANDIDATES:
+            # Comparing with every name is too slow for large indexes, compare with the names sharing most
+            # character pairs with name instead
+            if self.names_by_bigram is None:
+                names_by_bigram = {}
+                for folded_name in self.folded_names:
+                    for bigram in _bigrams(folded_name):
+                        names_by_bigram.setdefault(bigram, []).append(folded_name)
+                self.names_by_bigram = names_by_bigram
+            shared = Counter()
+            for bigram in _bigrams(name):
+                shared.update(self.names_by_bigram.get(bigram, ()))
+            candidates = nlargest(_SUGGEST_CANDIDATES, shared, key=shared.__getitem__)
+
+        result = {}
+        for folded_name in get_close_matches(name, candidates, n=count):
+            result.update(self.tokens_by_folded_name[folded_name])
+        return tuple(result)[:count]
+
+
+# Number of names compared in full by suggest()
+_SUGGEST_CANDIDATES = 100
+
+
+def _bigrams(name):
+    name = f' {name} '
+    return {name[i:i + 2] for i in range(len(name) - 1)}
+
+
+def _name_index(owner, get_tokens):
+    """
+    The _NameIndex of a Token class or a container, built on first use. Token classes drop it when a container
+    is registered.
+    """
+    name_index = owner.__dict__.get('_name_index')
+    if name_index is None:
+        with _container_lock:
+            name_index = owner.__dict__.get('_name_index')
+            if name_index is None:
+                name_index = _NameIndex(get_tokens())
+                owner._name_index = name_index
+    return name_index
+
+
+def _not_a_valid_value(value, owner):
+    # No suggestions here, a similarity search per rejected value would make invalid input expensive. Callers that
+    # want them ask suggest() for the values that failed.
+    return ValueError(f"{value} is not a valid value for {owner.__name__}")
+
+
+class _TokenLookup(dict):
+    """
+    Token names to tokens for the pydantic v2 core schema, which calls __getitem__ without a Python frame. Names
+    of containers registered after the schema was built go through owner._validate once and are then added.
+    """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner):
+        super().__init__(owner.__dict__.get('_tokens_by_name', {}))
+        self._owner = owner
+
+    def __missing__(self, name):
+        token = self._owner._validate(name)
+        self[name] = token
+        return token
+
+
+def _not_a_pydantic_type(container):
+    return Exception(f"{container.__name__} cannot be used as a type in pydantic. Use the class of the instances instead")
+
+
+# Bookkeeping attributes every token may carry, stored in slots for compact tokens
+_INTERNAL_SLOTS = (
+    '_token_attributes', '__override__', '_index', '_container', '_container_class', '_ordinal', HASH_KEY_ATTRIBUTE,
+    '_pending_derivation', 'qualified_name', '_repr', '_frozen',
+)
+
+# Bookkeeping attributes that default to None until the token is bound to a container. Class
+# attributes on Token, explicitly set in the constructor for compact tokens since they have slots.
+_INTERNAL_DEFAULTS = (
+    '_index', '_container', '_container_class', '_ordinal', HASH_KEY_ATTRIBUTE, '_pending_derivation', 'qualified_name', '_repr',
+    '_frozen',
+)
+
+# Deferred derivations are the same for many tokens, so the tuples describing them are shared
+_shared_pending_derivations = {}
+
+
+class TokenMeta(type):
+    """
+    Metaclass of Token. Lays out sub classes declared with `__compact__ = True` using `__slots__`
+    for all token attributes instead of storing them in the instance `__dict__`.
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        compact = namespace.get('__compact__', any(getattr(base, '__compact__', False) for base in bases))
+        if compact and '__slots__' not in namespace:
+            own_attributes = {k: v for k, v in namespace.items() if isinstance(v, TokenAttribute)}
+            # The slot descriptors replace the TokenAttribute class members, they are collected again in __init__
+            namespace = {k: v for k, v in namespace.items() if k not in own_attributes}
+            namespace['__token_attributes__'] = own_attributes
+
+            attribute_names = []
+            for base in bases:
+                attribute_names.extend(getattr(base, 'get_declared', dict)())
+            attribute_names.extend(own_attributes)
+
+            existing_slots = {slot for base in bases for klass in base.__mro__ for slot in klass.__dict__.get('__slots__', ())}
+            namespace['__slots__'] = tuple(
+                slot
+                for slot in dict.fromkeys(attribute_names + list(_INTERNAL_SLOTS))
+                if slot not in existing_slots
+            )
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+    def __init__(cls, name, bases, namespace, **kwargs):
+        super().__init__(name, bases, namespace, **kwargs)
+        own_attributes = cls.__dict__.get('__token_attributes__')
+        if own_attributes is not None:
+            del cls.__token_attributes__
+            token_attributes = dict(cls.get_declared())
+            token_attributes.update(own_attributes)
+            cls.set_declared(token_attributes)
+
+        if '__init__' not in namespace and _has_generated_constructor(cls):
+            cls.__init__ = _generate_constructor(cls)
+
 
 @declarative(TokenAttribute, add_init_kwargs=False)
-class Token:
+class Token(metaclass=TokenMeta):
+    # Set to True in a sub class to store token attributes in __slots__ instead of the instance __dict__
+    __compact__ = False
+
+    # Containers holding tokens of this class, with their tokens indexed by name. See _register_container
+    _container_classes = set()
+    _tokens_by_name = {}
+    _conflicting_names = set()
+
+    _index = None
+    _container = None
+    _container_class = None
+    # The ordinal of the token in _container_class, for TokenMap
+    _ordinal = None
+    _hash = None
+    _pending_derivation = None
+    # Set by _freeze, when the token is bound to a container. The qualified name is prefix.name, or the name when
+    # there is no prefix, as returned by str().
+    qualified_name = None
+    _repr = None
+    _frozen = None
+
     name = TokenAttribute()
 
     @classmethod
@@ -41,12 +330,8 @@ class Token:
         return tuple(cls.get_declared().keys())
 
     def __init__(self, *args, **kwargs):
-        for arg in args:
-            if isinstance(arg, PRESENT):
-                assert arg.attribute_name not in kwargs, f"{arg.attribute_name} used with PRESENT and kwarg at the same time"
-                kwargs[arg.attribute_name] = PRESENT
-            else:  # pragma: no cover
-                assert False, f"Unexpected position argument: {arg}"  # pragma: no mutate
+        # Sub classes normally get a generated constructor, see TokenMeta
+        _apply_present_arguments(args, kwargs)
 
         token_attributes = self.get_declared()
 
@@ -70,30 +355,145 @@ class Token:
 
         for name, value in attribute_values.items():
             if not isinstance(value, Hashable):
-                raise ValueError(f"Attribute {name} has unhashable value: {value}")
+                raise _unhashable_attribute_error(name, value)
 
             object.__setattr__(self, name, value)
 
+        self._set_internal_defaults()
         self._set_derived_attributes()
 
-    def _set_derived_attributes(self):
+    @classmethod
+    def _from_resolved_values(cls, names, rows):
+        """
+        Tokens with attribute values that were validated and derived before, e.g. by the container that wrote a
+        from_csv or from_json cache. Neither validated nor derived again.
+        """
+        token_attributes = cls.get_declared()
+        new = cls.__new__
+        tokens = []
+        for values in rows:
+            token = new(cls)
+            if cls.__compact__:
+                for name, value in zip(names, values):
+                    object.__setattr__(token, name, value)
+                object.__setattr__(token, '_token_attributes', token_attributes)
+                object.__setattr__(token, '__override__', False)
+                token._set_internal_defaults()
+            else:
+                attributes = dict(zip(names, values))
+                attributes['_token_attributes'] = token_attributes
+                attributes['__override__'] = False
+                object.__setattr__(token, '__dict__', attributes)
+            tokens.append(token)
+        return tokens
+
+    def _set_internal_defaults(self):
+        if self.__compact__:
+            for name in _INTERNAL_DEFAULTS:
+                object.__setattr__(self, name, None)
+
+    @classmethod
+    def _derived_attributes(cls):
+        derived_attributes = cls.__dict__.get('_derived_attribute_cache')
+        if derived_attributes is None:
+            derived_attributes = tuple(
+                (name, token_attribute)
+                for name, token_attribute in cls.get_declared().items()
+                if token_attribute.value is not None or token_attribute.optional_value is not None
+            )
+            cls._derived_attribute_cache = derived_attributes
+        return derived_attributes
+
+    def _underived_attributes(self):
+        """
+        Name and current value of the attributes that _set_derived_attributes would derive
+        """
+        underived = []
         if self.name is not None:
+            for name, token_attribute in self._derived_attributes():
+                value = getattr(self, name, None)
+                if (
+                    (token_attribute.value is not None and value is None) or
+                    (token_attribute.optional_value is not None and (value is PRESENT or isinstance(value, PRESENT)))
+                ):
+                    underived.append((name, value))
+        return tuple(underived)
+
+    def _set_derived_attributes(self):
+        if self._frozen:
+            return
+        underived = self._pending_derivation or self._underived_attributes()
+        if underived:
+            pending = dict(underived)
+            values = {k: pending[k] if k in pending else getattr(self, k, None) for k in self._token_attributes}
+            profile = _profile
             for name, token_attribute in self._token_attributes.items():
                 if token_attribute.value is not None:
-                    existing_value = getattr(self, name, None)
-                    if existing_value is None:
-                        kwargs = {k: getattr(self, k, None) for k in self._token_attributes}
-                        new_value = token_attribute.value(**kwargs)
-                        object.__setattr__(self, name, new_value)
+                    if values[name] is None:
+                        if profile is None:
+                            values[name] = token_attribute.value(**values)
+                        else:
+                            values[name] = profile.derive(self, name, token_attribute.value, values)
+                        pending[name] = None
 
                 if token_attribute.optional_value is not None:
-                    existing_value = getattr(self, name, None)
+                    existing_value = values[name]
                     if existing_value is PRESENT or isinstance(existing_value, PRESENT):
-                        kwargs = {k: getattr(self, k, None) for k in self._token_attributes}
-                        new_value = token_attribute.optional_value(**kwargs)
+                        if profile is None:
+                            new_value = token_attribute.optional_value(**values)
+                        else:
+                            new_value = profile.derive(self, name, token_attribute.optional_value, values)
                         # Only update if we got a value (otherwise retain the PRESENT marker)
                         if new_value is not None:
-                            object.__setattr__(self, name, new_value)
+                            values[name] = new_value
+                            pending[name] = None
+
+            for name in pending:
+                object.__setattr__(self, name, values[name])
+            # Last, so that a concurrent reader either finds the attribute or still finds the derivation pending
+            if self._pending_derivation is not None:
+                object.__setattr__(self, '_pending_derivation', None)
+                if self.qualified_name is not None:
+                    self._freeze()
+
+    def _freeze(self):
+        """
+        Called when the container of the token is created, when its name and prefix are final. Computes the hash, the
+        interned qualified name and the repr, and marks the token as frozen once all its attributes are derived. Reading a frozen token writes
+        nothing to it, which keeps the memory pages holding it shared after fork. Tokens of lazy containers are
+        frozen after their first derivation.
+        """
+        if self._frozen:
+            return
+        if self.qualified_name is None:
+            qualified_name = sys.intern(self._format_str())
+            object.__setattr__(self, 'qualified_name', qualified_name)
+            object.__setattr__(self, '_repr', f'<{type(self).__name__}: {qualified_name}>')
+        if self._pending_derivation is None:
+            if self._hash is None:
+                object.__setattr__(self, HASH_KEY_ATTRIBUTE, self._compute_hash())
+            object.__setattr__(self, '_frozen', True)
+
+    def _defer_derived_attributes(self):
+        """
+        Remove the attributes that _set_derived_attributes would derive, to have them derived on first access instead
+        """
+        if self._pending_derivation is None and not self._frozen:
+            pending = self._underived_attributes()
+            if pending:
+                object.__setattr__(self, '_pending_derivation', _shared_pending_derivations.setdefault(pending, pending))
+                for name, _ in pending:
+                    object.__delattr__(self, name)
+
+    def __getattr__(self, name):
+        # Only called when the normal lookup fails. For tokens in a lazy container that means it is time to
+        # derive the deferred attributes.
+        if name not in _INTERNAL_SLOTS and name in self._token_attributes:
+            if self._pending_derivation is not None:
+                self._set_derived_attributes()
+            # Derived now, or by another thread since the lookup failed
+            return object.__getattribute__(self, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def __setattr__(self, k, v):
         raise TypeError(f"'{type(self).__name__}' object attributes are read-only")
@@ -122,37 +522,47 @@ class Token:
         return self._index >= other._index
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(self) is not type(other):
             return False
         if self.name != other.name:
             return False
-        try:
-            return self._container == other._container
-        except AttributeError:
-            return True
+        # A token not (yet) in a container is equal to any token of the same name
+        return self._container is None or other._container is None or self._container == other._container
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        try:
-            _hash = object.__getattribute__(self, HASH_KEY_ATTRIBUTE)
-        except AttributeError:
-            _hash = hash(tuple(
-                (k, getattr(self, k))
-                for k in sorted(self._token_attributes)
-            ))
+        # Precomputed by TokenContainerMeta for tokens in a container
+        _hash = self._hash
+        if _hash is None:
+            _hash = self._compute_hash()
             object.__setattr__(self, HASH_KEY_ATTRIBUTE, _hash)
         return _hash
 
+    def _compute_hash(self):
+        # The same for tokens in a container, their unpickled copies and equal free standing tokens
+        return hash(tuple(
+            (k, getattr(self, k))
+            for k in sorted(self._token_attributes)
+        ))
+
     def __repr__(self):
-        return '<{}: {}{}>'.format(
-            type(self).__name__,
-            (self.prefix + '.') if getattr(self, 'prefix', None) else '',
-            self.name if self.name else '(unnamed)',
-        )
+        # Precomputed by _freeze for tokens in a container
+        _repr = self._repr
+        if _repr is None:
+            _repr = f'<{type(self).__name__}: {self._format_str()}>'
+        return _repr
 
     def __str__(self):
+        qualified_name = self.qualified_name
+        if qualified_name is None:
+            qualified_name = self._format_str()
+        return qualified_name
+
+    def _format_str(self):
         return '{}{}'.format(
             (self.prefix + '.') if getattr(self, 'prefix', None) else '',
             self.name if self.name else '(unnamed)',
@@ -164,6 +574,13 @@ class Token:
     def __deepcopy__(self, _):
         return self
 
+    def __reduce_ex__(self, protocol):
+        # Tokens in an importable container are pickled as a reference, and unpickle to the very same token
+        container = self._container_class
+        if container is not None and container._is_importable() and container.tokens.get(self.name) is self:
+            return _unpickle_token, (container, self.name)
+        return object.__reduce_ex__(self, protocol)
+
     def __getstate__(self):
         return (
             {k: getattr(self, k) for k in self._token_attributes},
@@ -173,6 +590,7 @@ class Token:
 
     def __setstate__(self, state):
         d, _container, _index = state
+        self._set_internal_defaults()
         for k, v in d.items():
             object.__setattr__(self, k, v)
         object.__setattr__(self, '_token_attributes', {k: TokenAttribute() for k in d})
@@ -187,13 +605,8 @@ class Token:
         """
         Interface method for using a Token as part of a pydantic model or dataclass
         """
-        found_names = set()
-        for container in cls._container_classes:
-            new_names = set(token.name for token in container)
-            overlap = new_names & found_names
-            if bool(overlap):
-                raise TypeError(f'Non-unique names: {", ".join(overlap)}')
-            found_names |= new_names
+        if cls._conflicting_names:
+            raise TypeError(f'Non-unique names: {", ".join(sorted(cls._conflicting_names))}')
 
         yield cls._validate
 
@@ -202,35 +615,297 @@ class Token:
         if isinstance(value, cls):
             return value
         if isinstance(value, str):
-            for container in cls._container_classes:
-                token = container.get(value)
-                if token is not None:
-                    return token
-            raise ValueError(f"{value} is not a valid value for {cls.__name__}")
+            token = cls._tokens_by_name.get(value)
+            if token is not None:
+                return token
+            raise _not_a_valid_value(value, cls)
         raise ValueError(f"Given '{type(value).__name__}' expected either an instance of '{cls.__name__}' or 'str'")
 
+    @classmethod
+    def _get_name_index(cls):
+        return _name_index(cls, lambda: [
+            token
+            for container in cls.__dict__.get('_container_classes', ())
+            for token in container
+            if isinstance(token, cls)
+        ])
+
+    @classmethod
+    def resolve(cls, name, default=None):
+        """
+        The token of this class named name, also accepting a qualified prefix.name and a different case, if only one
+        token matches, else default
+        """
+        if not isinstance(name, str):
+            return default
+        token = cls._get_name_index().resolve(name)
+        return default if token is None else token
+
+    @classmethod
+    def with_prefix(cls, prefix):
+        """
+        Tokens of this class with a name or qualified name starting with prefix in any case, sorted by name
+        """
+        return cls._get_name_index().with_prefix(prefix)
+
+    @classmethod
+    def suggest(cls, name, count=3):
+        """
+        Tokens of this class with names similar to name, most similar first
+        """
+        return cls._get_name_index().suggest(name, count)
+
+    @classmethod
+    def validate_many(cls, values):
+        """
+        Coerce an iterable of tokens and token names, e.g. a column of a CSV file, to tokens.
+
+        Each distinct value is only looked up once. A NumPy string or object array gives an object array back.
+        All invalid values are reported together in one ValueError.
+        """
+        return _validate_many(values, cls._validate)
+
     @classmethod
     def __modify_schema__(cls, field_schema):
         """
         Interface method for using a Token as part of a pydantic model or dataclass
         """
-        token_names = [token.name for c in cls._container_classes for token in c]
-        field_schema.update(
-            pattern=f"^{'|'.join(token_names)}$",
-            examples=token_names,
+        field_schema.update(cls._json_schema())
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        """
+        Interface method for using a Token as part of a pydantic v2 model or dataclass.
+
+        Names are looked up in a dict by pydantic-core itself, and tokens are serialized to JSON as their names.
+        """
+        from pydantic_core import core_schema
+
+        if cls._conflicting_names:
+            raise TypeError(f'Non-unique names: {", ".join(sorted(cls._conflicting_names))}')
+
+        lookup = _TokenLookup(cls)
+        return core_schema.json_or_python_schema(
+            json_schema=core_schema.no_info_after_validator_function(lookup.__getitem__, core_schema.str_schema()),
+            python_schema=core_schema.union_schema(
+                [
+                    core_schema.no_info_after_validator_function(
+                        lookup.__getitem__,
+                        core_schema.str_schema(strict=True),
+                    ),
+                    core_schema.is_instance_schema(cls),
+                ],
+                mode='left_to_right',
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(attrgetter('name'), when_used='json'),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, core_schema, handler):
+        """
+        Interface method for pydantic v2, the same schema as __modify_schema__
+        """
+        return cls._json_schema()
+
+    @classmethod
+    def _json_schema(cls):
+        """
+        A new schema dict on every call, consumers of the schema may change it. The pattern and names are cached
+        until another container is registered.
+        """
+        schema = cls.__dict__.get('_schema')
+        if schema is None:
+            with _container_lock:
+                schema = cls.__dict__.get('_schema')
+                if schema is None:
+                    token_names = [
+                        name
+                        for name, token in cls.__dict__.get('_tokens_by_name', {}).items()
+                        if isinstance(token, cls)
+                    ]
+                    schema = (f"^{_names_pattern(token_names)}$", tuple(token_names))
+                    cls._schema = schema
+        pattern, examples = schema
+        return dict(
+            pattern=pattern,
+            examples=list(examples),
             type="string",
         )
 
     @classmethod
     def _register_container(cls, container):
+        # Called by TokenContainerMeta with _container_lock held
         _container_classes = cls.__dict__.get('_container_classes')
 
         if _container_classes is None:
             _container_classes = set()
             cls._container_classes = _container_classes
+            cls._tokens_by_name = {}
+            cls._conflicting_names = set()
 
+        if container in _container_classes:
+            return
         _container_classes.add(container)
 
+        # Index the tokens by name so coercion from strings is a single lookup. The same token
+        # showing up again through container inheritance is fine, a different token by the same name is not.
+        tokens_by_name = cls._tokens_by_name
+        for name, token in container.tokens.items():
+            if tokens_by_name.setdefault(name, token) is not token:
+                cls._conflicting_names.add(name)
+        cls._name_index = None
+        cls._schema = None
+
+
+# Characters with a meaning in regular expressions, outside of and inside character classes. Escaping them
+# only keeps the patterns valid as ECMA 262 regular expressions, as used by JSON schema, also with the u and v flags
+# (v makes brackets, parentheses, braces, / and | syntax in character classes too).
+_PATTERN_SPECIAL_CHARACTERS = frozenset('^$\\.*+?()[]{}|/')
+_PATTERN_CLASS_SPECIAL_CHARACTERS = frozenset('^\\[]-(){}/|')
+
+
+def _names_pattern(names):
+    """
+    A regular expression matching exactly the given names, with the names merged into a trie, e.g.
+    "(?:foo|ba[rz])" for foo, bar and baz
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for character in name:
+            node = node.setdefault(character, {})
+        # End of a name
+        node[''] = {}
+    return _trie_pattern(trie)[0]
+
+
+def _trie_pattern(node):
+    """
+    The pattern for the names below node, and whether it is a single atom a quantifier can apply to
+    """
+    branches = []
+    last_characters = []
+    for character, child in node.items():
+        if not character:
+            continue
+        tail, _ = _trie_pattern(child)
+        if tail:
+            branches.append(('\\' if character in _PATTERN_SPECIAL_CHARACTERS else '') + character + tail)
+        else:
+            last_characters.append(character)
+
+    atom = False
+    if len(last_characters) == 1 and not branches:
+        atom = True
+    if len(last_characters) == 1:
+        branches.append(('\\' if last_characters[0] in _PATTERN_SPECIAL_CHARACTERS else '') + last_characters[0])
+    elif last_characters:
+        atom = not branches
+        branches.append('[' + ''.join(('\\' if c in _PATTERN_CLASS_SPECIAL_CHARACTERS else '') + c for c in last_characters) + ']')
+
+    if not branches:
+        return '', False
+    if len(branches) == 1:
+        pattern = branches[0]
+    else:
+        pattern, atom = f"(?:{'|'.join(branches)})", True
+    if '' in node:
+        if not atom:
+            pattern = f'(?:{pattern})'
+        pattern, atom = pattern + '?', False
+    return pattern, atom
+
+
+def _has_generated_constructor(token_class):
+    """
+    A Token sub class gets a generated constructor unless it, or one of its bases, defines its own __init__
+    """
+    constructor = token_class.__init__
+    return constructor is Token.__init__ or getattr(constructor, '_token_class', None) is not None
+
+
+def _generate_constructor(token_class):
+    """
+    Generate an __init__ specialized for the exact attribute set of a Token sub class.
+
+    The generated code does the same thing as the generic Token.__init__ followed by
+    Token._set_derived_attributes, but with the attribute loop unrolled, defaults and
+    value/optional_value callables bound up front and all values kept in locals until
+    they are stored on the instance.
+    """
+    token_attributes = token_class.get_declared()
+    names = list(token_attributes)
+    namespace = dict(
+        token_class=token_class,
+        token_attributes=token_attributes,
+        generic_constructor=Token.__init__,
+        apply_present_arguments=_apply_present_arguments,
+        unhashable_attribute_error=_unhashable_attribute_error,
+        PRESENT=PRESENT,
+        setattr_=object.__setattr__,
+    )
+
+    lines = [
+        'def __init__(self, *args, **kwargs):',
+        '    if type(self) is not token_class:',
+        '        return generic_constructor(self, *args, **kwargs)',
+        '    if args:',
+        '        apply_present_arguments(args, kwargs)',
+        '    pop = kwargs.pop',
+    ]
+    for i, (name, token_attribute) in enumerate(token_attributes.items()):
+        default = token_attribute.default
+        if default is MISSING:
+            default = None
+        namespace[f'default_{i}'] = default
+        lines.append(f'    v{i} = pop({name!r}, default_{i})')
+    lines += [
+        "    override = pop('__override__', False)",
+        '    assert len(kwargs) == 0, f"Unexpected constructor arguments: {kwargs}"  # pragma: no mutate',
+    ]
+
+    for i, name in enumerate(names):
+        # Same test as isinstance(value, Hashable), without going through the ABC machinery
+        lines += [
+            f'    if type(v{i}).__hash__ is None:',
+            f'        raise unhashable_attribute_error({name!r}, v{i})',
+        ]
+
+    all_values = '{' + ', '.join(f'{name!r}: v{i}' for i, name in enumerate(names)) + '}'
+    derivation = []
+    for i, token_attribute in enumerate(token_attributes.values()):
+        if token_attribute.value is not None:
+            namespace[f'value_{i}'] = token_attribute.value
+            derivation += [
+                f'        if v{i} is None:',
+                f'            v{i} = value_{i}(**{all_values})',
+            ]
+        if token_attribute.optional_value is not None:
+            namespace[f'optional_value_{i}'] = token_attribute.optional_value
+            derivation += [
+                f'        if v{i} is PRESENT or isinstance(v{i}, PRESENT):',
+                f'            new_value = optional_value_{i}(**{all_values})',
+                '            if new_value is not None:',
+                f'                v{i} = new_value',
+            ]
+    if derivation:
+        lines.append(f"    if v{names.index('name')} is not None:")
+        lines += derivation
+
+    lines += [f'    setattr_(self, {name!r}, v{i})' for i, name in enumerate(names)]
+    lines += [
+        "    setattr_(self, '_token_attributes', token_attributes)",
+        "    setattr_(self, '__override__', override)",
+    ]
+    if token_class.__compact__:
+        lines += [f'    setattr_(self, {name!r}, None)' for name in _INTERNAL_DEFAULTS]
+
+    exec('\n'.join(lines), namespace)
+    constructor = namespace['__init__']
+    constructor._token_class = token_class
+    constructor.__qualname__ = f'{token_class.__qualname__}.__init__'
+    return constructor
+
 
 @declarative(Token)
 @with_meta
@@ -239,63 +914,143 @@ class ContainerBase:
 
 
 _next_index = 0
+_container_lock = RLock()
 
 
-class TokenContainerMeta(ContainerBase.__class__):
-
-    def __init__(cls, name, bases, dct):
+# Version of the from_csv and from_json cache files, for changes in what they hold
+_CACHE_FORMAT = 1
 
-        super(TokenContainerMeta, cls).__init__(name, bases, dct)
 
-        prefix = getattr(cls.get_meta(), 'prefix', cls.__name__)
+def _caller_module():
+    """
+    The module calling the function that calls this, as collections.namedtuple finds it
+    """
+    try:
+        return sys._getframe(2).f_globals.get('__name__', '__main__')
+    except (AttributeError, ValueError):  # pragma: no cover
+        return None
 
-        all_tokens = {}
-        for token_name, token in cls.get_declared().items():
 
-            if (
-                token_name in cls.__dict__ and
-                any(token_name in base.get_declared() for base in bases) and
-                not token.__override__
-            ):
-                raise TypeError('Illegal enum value override. Use __override__=True parameter to override.')
-
-            if token.name is None:
-                object.__setattr__(token, 'name', token_name)
-            else:
-                assert token.name == token_name
+def _unpickle_token(container, name):
+    return container.tokens[name]
 
-            if prefix:
-                assert 'prefix' in token.attribute_names(), 'You must define a token attribute called "prefix"'
-                if token.prefix is None:
-                    object.__setattr__(token, 'prefix', prefix)
 
-            if not hasattr(token, '_index'):
-                global _next_index
-                object.__setattr__(token, '_index', _next_index)
-                _next_index += 1
+def _code_typecode(count):
+    """
+    The smallest unsigned array typecode that can hold ordinals 0 to count - 1
+    """
+    for typecode in 'BHI':
+        if count <= 1 << (8 * array(typecode).itemsize):
+            return typecode
+    return 'Q'  # pragma: no cover
 
-            if not hasattr(token, '_container'):
-                object.__setattr__(token, '_container', f"{cls.__module__}.{cls.__name__}")
 
-            token._set_derived_attributes()
-
-            if hasattr(token, HASH_KEY_ATTRIBUTE):
-                object.__delattr__(token, HASH_KEY_ATTRIBUTE)
-
-            all_tokens[token.name] = token
-
-        cls.tokens = all_tokens
+class TokenContainerMeta(ContainerBase.__class__):
 
-        for token in all_tokens.values():
-            token._register_container(cls)
+    def __init__(cls, name, bases, dct):
 
-        cls.set_declared(cls.tokens)
+        with nullcontext() if _profile is None else _profile.creating(cls):
+            super(TokenContainerMeta, cls).__init__(name, bases, dct)
+
+            meta = cls.get_meta()
+            prefix = getattr(meta, 'prefix', cls.__name__)
+            lazy = getattr(meta, 'lazy_derived_attributes', False)
+            # Set by from_csv and from_json for tokens loaded from their cache, with all attributes already derived
+            resolved = cls.__dict__.get('_resolved_tokens', False)
+
+            # Binding tokens mutates them, and shared state like _next_index and the name index of the token
+            # classes. Serialize container creation; readers never lock, they only see tokens once bound.
+            with _container_lock:
+                all_tokens = {}
+                inherited_names = {token_name for base in bases for token_name in base.get_declared()}
+                for token_name, token in cls.get_declared().items():
+
+                    if (
+                        token_name in cls.__dict__ and
+                        token_name in inherited_names and
+                        not token.__override__
+                    ):
+                        raise TypeError('Illegal enum value override. Use __override__=True parameter to override.')
+
+                    if token.name is None:
+                        object.__setattr__(token, 'name', token_name)
+                    else:
+                        assert token.name == token_name
+
+                    if prefix:
+                        assert 'prefix' in token.attribute_names(), 'You must define a token attribute called "prefix"'
+                        if token.prefix is None:
+                            object.__setattr__(token, 'prefix', prefix)
+
+                    if token._index is None:
+                        global _next_index
+                        object.__setattr__(token, '_index', _next_index)
+                        _next_index += 1
+
+                    if token._container is None:
+                        object.__setattr__(token, '_container', f"{cls.__module__}.{cls.__name__}")
+                        object.__setattr__(token, '_container_class', cls)
+
+                    if resolved or token._frozen:
+                        # Derived already, e.g. by the container this one inherits the token from
+                        pass
+                    elif lazy:
+                        token._defer_derived_attributes()
+                    else:
+                        token._set_derived_attributes()
+
+                    all_tokens[token.name] = token
+
+                cls.tokens = all_tokens
+
+                # Dense per container ordinals, in declaration order, for encode/decode
+                cls._tokens_by_ordinal = tuple(all_tokens.values())
+                cls._ordinals_by_id = {id(token): ordinal for ordinal, token in enumerate(cls._tokens_by_ordinal)}
+                for ordinal, token in enumerate(cls._tokens_by_ordinal):
+                    if token._container_class is cls:
+                        object.__setattr__(token, '_ordinal', ordinal)
+                cls._code_typecode = _code_typecode(len(all_tokens))
+                # Tokens sorted by documentation_sort_key, filled in by the first call to ordered()
+                cls._documentation_order = None
+                # Built on first use by resolve(), with_prefix() and suggest()
+                cls._name_index = None
+
+                cls._unique_indexes = {'name': all_tokens}
+                for attribute in getattr(meta, 'unique_indexes', ()):
+                    index = {}
+                    for token in all_tokens.values():
+                        value = getattr(token, attribute, None)
+                        if value is None:
+                            continue
+                        if value in index:
+                            raise TypeError(f'Duplicate value {value!r} of unique index {attribute} in {cls.__name__}: {index[value].name} and {token.name}')
+                        index[value] = token
+                    cls._unique_indexes[attribute] = index
+
+                cls._indexes = {}
+                for attribute in getattr(meta, 'indexes', ()):
+                    index = {}
+                    for token in all_tokens.values():
+                        index.setdefault(getattr(token, attribute, None), []).append(token)
+                    cls._indexes[attribute] = {value: tuple(tokens) for value, tokens in index.items()}
+
+                for token_class in dict.fromkeys(type(token) for token in all_tokens.values()):
+                    token_class._register_container(cls)
+
+                for token in all_tokens.values():
+                    token._freeze()
+
+            cls.set_declared(cls.tokens)
 
     def __iter__(cls):
         return iter(cls.tokens.values())
 
     def __contains__(cls, item):
-        return item in cls.tokens.values()
+        # cls.tokens doubles as the membership index: only the token with the same name can be equal
+        if not isinstance(item, Token):
+            return False
+        token = cls.tokens.get(item.name)
+        return token is item or (token is not None and token == item)
 
     def __len__(cls):
         return len(cls.tokens.values())
@@ -309,6 +1064,11 @@ class TokenContainer(ContainerBase, metaclass=TokenContainerMeta):
         prefix = ''
         documentation_columns = ['name']
         documentation_sort_key = None
+        # Derive token attributes with value or optional_value on first access instead of when the container is created
+        lazy_derived_attributes = False
+        # Token attributes to index for by() and filter(), with unique values (None excepted) or not
+        unique_indexes = ()
+        indexes = ()
 
     @classmethod  # pragma: no mutate
     def __iter__(cls):  # pragma: no cover
@@ -325,9 +1085,28 @@ class TokenContainer(ContainerBase, metaclass=TokenContainerMeta):
         """
         Interface method for pydantic
         """
-        raise Exception(
-            f"{cls.__name__} cannot be used as a type in pydantic. Use the class of the instances instead"
-        )
+        raise _not_a_pydantic_type(cls)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        """
+        Interface method for pydantic v2
+        """
+        raise _not_a_pydantic_type(cls)
+
+    @classmethod
+    def _is_importable(cls):
+        """
+        Whether the container can be found by module and qualified name, as pickle does for classes
+        """
+        importable = cls.__dict__.get('_importable')
+        if importable is None:
+            found = sys.modules.get(cls.__module__)
+            for part in cls.__qualname__.split('.'):
+                found = getattr(found, part, None)
+            importable = found is cls
+            cls._importable = importable
+        return importable
 
     @classmethod
     def get(cls, key, default=None):
@@ -336,46 +1115,405 @@ class TokenContainer(ContainerBase, metaclass=TokenContainerMeta):
         except KeyError:
             return default
 
+    @classmethod
+    def validate_many(cls, values):
+        """
+        Coerce an iterable of tokens and token names to tokens of this container.
+
+        Each distinct value is only looked up once. A NumPy string or object array gives an object array back.
+        All invalid values are reported together in one ValueError.
+        """
+        return _validate_many(values, cls._validate)
+
+    @classmethod
+    def _validate(cls, value):
+        if isinstance(value, str):
+            token = cls.get(value)
+            if token is not None:
+                return token
+        elif value in cls:
+            return value
+        elif not isinstance(value, Token):
+            raise ValueError(f"Given '{type(value).__name__}' expected either a token in '{cls.__name__}' or 'str'")
+        raise _not_a_valid_value(value, cls)
+
+    @classmethod
+    def _get_name_index(cls):
+        return _name_index(cls, lambda: cls._tokens_by_ordinal)
+
+    @classmethod
+    def resolve(cls, name, default=None):
+        """
+        The token named name, also accepting a qualified prefix.name and a different case, if only one token
+        matches, else default
+        """
+        if not isinstance(name, str):
+            return default
+        token = cls._get_name_index().resolve(name)
+        return default if token is None else token
+
+    @classmethod
+    def with_prefix(cls, prefix):
+        """
+        Tokens with a name or qualified name starting with prefix in any case, sorted by name
+        """
+        return cls._get_name_index().with_prefix(prefix)
+
+    @classmethod
+    def suggest(cls, name, count=3):
+        """
+        Tokens with names similar to name, most similar first
+        """
+        return cls._get_name_index().suggest(name, count)
+
+    @classmethod
+    def by(cls, attribute, value):
+        """
+        Look up tokens by the value of an attribute in the indexes or unique_indexes of the Meta. For a unique index
+        the token with the value, or None, else a tuple of the tokens with the value in declaration order.
+        """
+        index = cls._unique_indexes.get(attribute)
+        if index is not None:
+            return index.get(value)
+        index = cls._indexes.get(attribute)
+        if index is not None:
+            return index.get(value, ())
+        raise ValueError(f'{attribute} is not an indexed attribute of {cls.__name__}')
+
+    @classmethod
+    def filter(cls, **attributes):
+        """
+        The tokens with all the given attribute values, in declaration order. The candidates are the tokens found in
+        the most selective index among the given attributes, the remaining attributes are compared token by token.
+        """
+        candidates = cls._tokens_by_ordinal
+        for attribute, value in attributes.items():
+            if attribute in cls._unique_indexes and value is not None:
+                token = cls._unique_indexes[attribute].get(value)
+                tokens = () if token is None else (token,)
+            elif attribute in cls._indexes:
+                tokens = cls._indexes[attribute].get(value, ())
+            else:
+                continue
+            if len(tokens) < len(candidates):
+                candidates = tokens
+        return tuple(
+            token
+            for token in candidates
+            if all(getattr(token, attribute, None) == value for attribute, value in attributes.items())
+        )
+
+    @classmethod
+    def from_records(cls, name, token_class, records, meta=None, module=None):
+        """
+        A new sub class of this container named name, with a token_class token per record, in order.
+
+        Records are mappings of attribute names to values, with the name of the token under 'name'. Missing attributes
+        and None values get their default or derived values, as for tokens declared in a class body. A record without
+        a name, or with the name of an earlier record, is a ValueError. meta is a mapping of Meta options, e.g.
+        prefix. module is the __module__ of the container, by default the module of the caller, as for pickling tokens
+        by reference the container needs to be a global of that module.
+        """
+        if module is None:
+            module = _caller_module()
+        tokens = {}
+        for record in records:
+            attributes = {k: v for k, v in record.items() if v is not None}
+            token_name = attributes.pop('name', None)
+            if token_name is None:
+                raise ValueError(f'Record {len(tokens)} of {name} has no name: {record!r}')
+            if token_name in tokens:
+                raise ValueError(f'Duplicate token name {token_name!r} in the records of {name}')
+            # The container sets the name, and derives attribute values once it has set the prefix too
+            tokens[token_name] = token_class(**attributes)
+        namespace = {'__module__': module, '__qualname__': name, **tokens}
+        if meta:
+            namespace['Meta'] = type('Meta', (), dict(meta))
+        return type(cls)(name, (cls,), namespace)
+
+    @classmethod
+    def from_csv(cls, name, token_class, path, meta=None, module=None, cache_dir=None, **reader_kwargs):
+        """
+        A new sub class of this container from a CSV file with a header row, see from_records. Empty cells are
+        missing values. With cache_dir the resolved tokens are cached there, see _load_cached_records.
+        """
+        def parse(source):
+            rows = csv.DictReader(StringIO(source.decode('utf8'), newline=''), **reader_kwargs)
+            return ({k: v for k, v in row.items() if v != ''} for row in rows)
+
+        return cls._from_source(name, token_class, path, parse, meta, module or _caller_module(), cache_dir)
+
+    @classmethod
+    def from_json(cls, name, token_class, path, meta=None, module=None, cache_dir=None):
+        """
+        A new sub class of this container from a JSON file holding a list of records, see from_records. With
+        cache_dir the resolved tokens are cached there, see _load_cached_records.
+        """
+        return cls._from_source(name, token_class, path, json.loads, meta, module or _caller_module(), cache_dir)
+
+    @classmethod
+    def _from_source(cls, name, token_class, path, parse, meta, module, cache_dir):
+        """
+        Build the container from the records parsed from the file at path, or load it from cache_dir.
+
+        The cache file is named by the container name and a hash of the file contents. It holds the values of all
+        token attributes after derivation, so a warm start neither parses the source nor calls value and
+        optional_value. A cache written for another token class, other token attributes, another prefix or another
+        version of the cache format is rebuilt. Changes to the value callables are not detected, clear cache_dir
+        when they change. The cache is a pickle, only use a cache_dir that is as trusted as the code.
+        """
+        with open(path, 'rb') as f:
+            source = f.read()
+        if cache_dir is None:
+            return cls.from_records(name, token_class, parse(source), meta, module)
+
+        assert token_class is not Token, 'The cache needs the token attributes declared in a sub class of Token'
+        names = token_class.attribute_names()
+        prefix = (meta or {}).get('prefix', getattr(cls.get_meta(), 'prefix', name))
+        key = (_CACHE_FORMAT, f'{token_class.__module__}.{token_class.__qualname__}', names, prefix)
+        cache_path = os.path.join(cache_dir, f'{name}-{sha256(source).hexdigest()[:32]}.tokens')
+
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_key, rows = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+            cached_key, rows = None, None
+
+        if cached_key == key:
+            namespace = {'__module__': module, '__qualname__': name, '_resolved_tokens': True}
+            for token in token_class._from_resolved_values(names, rows):
+                namespace[token.name] = token
+            if meta:
+                namespace['Meta'] = type('Meta', (), dict(meta))
+            return type(cls)(name, (cls,), namespace)
+
+        container = cls.from_records(name, token_class, parse(source), meta, module)
+        # getattr also derives the attributes of lazy containers
+        rows = [tuple(getattr(token, attribute) for attribute in names) for token in container]
+        os.makedirs(cache_dir, exist_ok=True)
+        with NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False) as f:
+            try:
+                pickle.dump((key, rows), f, protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        # Atomic, concurrent processes each write a complete file and the last one wins
+        os.replace(f.name, cache_path)
+        return container
+
+    @classmethod
+    def ordinal(cls, token):
+        """
+        The position of `token` in this container, counting from 0 in declaration order.
+        """
+        ordinal = cls._ordinals_by_id.get(id(token))
+        if ordinal is None:
+            # An equal copy, e.g. unpickled
+            if token not in cls:
+                raise ValueError(f"{token!r} is not a member of {cls.__name__}")
+            ordinal = cls._ordinals_by_id[id(cls.tokens[token.name])]
+        return ordinal
+
+    @classmethod
+    def encode(cls, tokens):
+        """
+        Encode tokens of this container as their ordinals, in the smallest unsigned `array.array` type that
+        fits the container. A NumPy array of tokens gives a NumPy array of codes back.
+        """
+        numpy = sys.modules.get('numpy')
+        if numpy is not None and isinstance(tokens, numpy.ndarray):
+            codes = cls.encode(tokens.ravel().tolist())
+            return numpy.frombuffer(codes, dtype=codes.typecode).reshape(tokens.shape)
+
+        if not isinstance(tokens, (list, tuple)):
+            tokens = list(tokens)
+        try:
+            return array(cls._code_typecode, map(cls._ordinals_by_id.__getitem__, map(id, tokens)))
+        except KeyError:
+            return array(cls._code_typecode, map(cls.ordinal, tokens))
+
+    @classmethod
+    def decode(cls, codes):
+        """
+        Decode ordinals from `encode` back to a list of tokens. A NumPy array of codes gives an object array back.
+        """
+        numpy = sys.modules.get('numpy')
+        if numpy is not None and isinstance(codes, numpy.ndarray):
+            if codes.size and (codes.min() < 0 or codes.max() >= len(cls)):
+                raise ValueError(f"Invalid codes for {cls.__name__}")
+            return cls._decode_table(numpy)[codes]
+
+        if not (isinstance(codes, array) and codes.typecode in 'BHILQ'):
+            codes = list(codes)
+            if codes and min(codes) < 0:
+                raise ValueError(f"Invalid codes for {cls.__name__}")
+        try:
+            return list(map(cls._tokens_by_ordinal.__getitem__, codes))
+        except IndexError:
+            raise ValueError(f"Invalid codes for {cls.__name__}")
+
+    @classmethod
+    def _decode_table(cls, numpy):
+        table = cls.__dict__.get('_decode_array')
+        if table is None:
+            table = numpy.empty(len(cls), dtype=object)
+            table[:] = cls._tokens_by_ordinal
+            cls._decode_array = table
+        return table
+
     @classmethod
     def in_documentation_order(cls, sort_key=None):
-        tokens = list(cls)
-        if sort_key is None:
+        return list(cls.ordered(sort_key))
+
+    @classmethod
+    def ordered(cls, sort_key=None):
+        """
+        The tokens in documentation order, as a tuple: sorted by sort_key if given, else by the
+        documentation_sort_key of the Meta, else in declaration order. The tuple for the Meta order is shared
+        between calls, other sort keys sort on every call.
+        """
+        if sort_key is not None and sort_key is not cls.get_meta().documentation_sort_key:
+            return tuple(sorted(cls, key=sort_key))
+        tokens = cls._documentation_order
+        if tokens is None:
             sort_key = cls.get_meta().documentation_sort_key
-        if sort_key is not None:
-            tokens.sort(key=sort_key)
+            tokens = cls._tokens_by_ordinal if sort_key is None else tuple(sorted(cls, key=sort_key))
+            cls._documentation_order = tokens
         return tokens
 
     @classmethod
-    def to_csv(cls, columns=None, sort_key=None):
-        out = StringIO()
-        w = csv.writer(out)
+    def iter_csv(cls, columns=None, sort_key=None):
+        """
+        Yield the csv documentation one row at a time
+        """
+        row = StringIO()
+        w = csv.writer(row)
         if columns is None:
             columns = cls.get_meta().documentation_columns
         w.writerow(columns)
-        for token in cls.in_documentation_order(sort_key):
+        for token in cls.ordered(sort_key):
+            yield row.getvalue()
+            row.seek(0)
+            row.truncate()
             w.writerow([(getattr(token, a) or '') for a in columns])
-        return out.getvalue()
+        yield row.getvalue()
+
+    @classmethod
+    def write_csv(cls, out, columns=None, sort_key=None):
+        _write_chunks(out, cls.iter_csv(columns, sort_key))
+
+    @classmethod
+    def to_csv(cls, columns=None, sort_key=None):
+        return ''.join(cls.iter_csv(columns, sort_key))
+
+    @classmethod
+    def iter_confluence(cls, columns=None, sort_key=None):
+        """
+        Yield the confluence wiki markup documentation one row at a time
+        """
+        if columns is None:
+            columns = cls.get_meta().documentation_columns
+        yield '||' + '||'.join(columns) + '||\n'
+        for token in cls.ordered(sort_key):
+            yield '|' + '|'.join((getattr(token, a) or ' ') for a in columns) + '|\n'
+
+    @classmethod
+    def write_confluence(cls, out, columns=None, sort_key=None):
+        _write_chunks(out, cls.iter_confluence(columns, sort_key))
 
     @classmethod
     def to_confluence(cls, columns=None, sort_key=None):
-        out = StringIO()
+        return ''.join(cls.iter_confluence(columns, sort_key))
+
+    @classmethod
+    def iter_rst(cls, columns=None, sort_key=None):
+        """
+        Yield the RST grid table documentation one line at a time.
+
+        The tokens are visited twice, once to measure the column widths and once to write the rows, so no more than
+        a row is held in memory.
+        """
         if columns is None:
             columns = cls.get_meta().documentation_columns
-        out.write('||' + '||'.join(columns) + '||\n')
-        for token in cls.in_documentation_order(sort_key):
-            out.write('|' + '|'.join((getattr(token, a) or ' ') for a in columns) + '|\n')
-        return out.getvalue()
+        tokens = cls.ordered(sort_key)
+
+        header = [_rst_cell_lines(column) for column in columns]
+        widths = [max(_display_width(line) for line in cell) for cell in header]
+        for token in tokens:
+            for i, column in enumerate(columns):
+                cell = _rst_cell_lines(getattr(token, column))
+                widths[i] = max(widths[i], max(_display_width(line) for line in cell))
+
+        separator = '+' + '+'.join('-' * (width + 2) for width in widths) + '+\n'
+        yield separator
+        yield from _rst_row_lines(header, widths)
+        # Special separator between header and rows in RST
+        yield separator.replace('-', '=')
+        for token in tokens:
+            yield from _rst_row_lines([_rst_cell_lines(getattr(token, column)) for column in columns], widths)
+            yield separator
+
+    @classmethod
+    def write_rst(cls, out, columns=None, sort_key=None):
+        _write_chunks(out, cls.iter_rst(columns, sort_key))
 
     @classmethod
     def to_rst(cls, columns=None, sort_key=None):
-        input = StringIO(cls.to_csv(columns, sort_key).replace('\\', '\\\\').replace('`', '\\`').replace('*', '\\*'))
-        from prettytable import from_csv
-        table = from_csv(input)
-        lines = table.get_string(hrules=True).splitlines()
+        return ''.join(cls.iter_rst(columns, sort_key))[:-1]
 
-        # Special separator between header and rows in RST
-        lines[2] = lines[2].replace('-', '=')
-        return '\n'.join(lines)
+    @classmethod
+    def to_columns(cls, columns=None, sort_key=None, as_numpy=False):
+        """
+        Attribute values of the tokens, in documentation order, as a dict of column name to list of values.
+
+        With as_numpy, the columns are one dimensional NumPy arrays instead. A column of scalar values of one type gets
+        the dtype NumPy infers for it, any other column, e.g. of tuples, is an object array.
+        """
+        if columns is None:
+            columns = cls.get_meta().documentation_columns
+        tokens = cls.ordered(sort_key)
+        result = {column: [getattr(token, column) for token in tokens] for column in columns}
+        if as_numpy:
+            import numpy
+            for column, values in result.items():
+                if len({type(value) for value in values}) == 1 and numpy.isscalar(values[0]):
+                    result[column] = numpy.array(values)
+                else:
+                    # Slice assignment, as numpy.array would make a tuple per token into a row of a 2-D array
+                    array = numpy.empty(len(values), dtype=object)
+                    array[:] = values
+                    result[column] = array
+        return result
+
+    @classmethod
+    def to_arrow(cls, columns=None, sort_key=None):
+        """
+        The attribute values of the tokens, in documentation order, as a pyarrow Table. Columns with repeated
+        values are dictionary encoded. PRESENT, left by an optional_value without a value, is null. A column with
+        values pyarrow can not convert, e.g. of mixed types, is a TypeError.
+        """
+        import pyarrow
+        arrays = {}
+        for column, values in cls.to_columns(columns, sort_key).items():
+            values = [None if value is PRESENT else value for value in values]
+            try:
+                array = pyarrow.array(values)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as e:
+                raise TypeError(f'Column {column} of {cls.__name__} can not be converted to pyarrow: {e}') from e
+            if len(set(values)) < len(values) and not pyarrow.types.is_null(array.type):
+                array = array.dictionary_encode()
+            arrays[column] = array
+        return pyarrow.table(arrays)
+
+    @classmethod
+    def write_parquet(cls, out, columns=None, sort_key=None, **kwargs):
+        """
+        Write the attribute values of the tokens to a Parquet file or stream. Further keyword arguments are passed
+        on to pyarrow.parquet.write_table.
+        """
+        from pyarrow.parquet import write_table
+        write_table(cls.to_arrow(columns, sort_key), out, **kwargs)
 
     @classmethod
     def to_excel(cls, columns=None, sort_key=None):
@@ -389,7 +1527,7 @@ class TokenContainer(ContainerBase, metaclass=TokenContainerMeta):
         for i, heading in enumerate(columns):
             sheet.write(0, i, heading)
 
-        for row, field in enumerate(cls.in_documentation_order(sort_key)):
+        for row, field in enumerate(cls.ordered(sort_key)):
             for col, heading in enumerate(columns):
                 value = getattr(field, heading)
                 if value:
@@ -400,6 +1538,471 @@ class TokenContainer(ContainerBase, metaclass=TokenContainerMeta):
         return result.getvalue()
 
 
+_FLAGS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_DIGITS_TO_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+class TokenSet(Set):
+    """
+    An immutable set of tokens of one container, stored as an int bitmask over the container ordinals.
+
+    Set operations between TokenSets of the same container are operations on the masks, iteration is in
+    declaration order. Other sets of tokens and iterables work as with frozenset, but the result must only hold
+    tokens of the container.
+    """
+
+    __slots__ = ('_container', '_mask', '_hash_value', '_tokens')
+
+    def __init__(self, container, tokens=()):
+        if isinstance(tokens, TokenSet) and tokens._container is container:
+            mask = tokens._mask
+        else:
+            # One byte per token, written as a binary number with the first token last
+            flags = bytearray(len(container))
+            for ordinal in container.encode(tokens):
+                flags[ordinal] = 1
+            mask = int(flags[::-1].translate(_FLAGS_TO_DIGITS) or b'0', 2)
+        self._container = container
+        self._mask = mask
+        self._hash_value = None
+        self._tokens = None
+
+    @classmethod
+    def from_mask(cls, container, mask):
+        """
+        The TokenSet of the tokens whose ordinal bits are set in mask, as given by the mask property
+        """
+        if mask < 0 or mask >> len(container):
+            raise ValueError(f"Invalid mask for {container.__name__}")
+        result = cls.__new__(cls)
+        result._container = container
+        result._mask = mask
+        result._hash_value = None
+        result._tokens = None
+        return result
+
+    @property
+    def container(self):
+        return self._container
+
+    @property
+    def mask(self):
+        return self._mask
+
+    def _from_iterable(self, tokens):
+        return TokenSet(self._container, tokens)
+
+    def _same_container(self, other):
+        return isinstance(other, TokenSet) and other._container is self._container
+
+    def __iter__(self):
+        # The tokens are found once, sets are immutable
+        tokens = self._tokens
+        if tokens is None:
+            tokens = self._tokens = self._find_tokens()
+        return iter(tokens)
+
+    def _find_tokens(self):
+        tokens_by_ordinal = self._container._tokens_by_ordinal
+        mask = self._mask
+        if len(self) * 16 < len(tokens_by_ordinal):
+            # Few tokens, visit the set bits only, lowest first
+            tokens = []
+            while mask:
+                low = mask & -mask
+                tokens.append(tokens_by_ordinal[low.bit_length() - 1])
+                mask ^= low
+            return tuple(tokens)
+        # Many tokens, selecting them with one flag byte per ordinal is faster than one big int operation per token
+        return tuple(compress(tokens_by_ordinal, format(mask, 'b')[::-1].encode().translate(_DIGITS_TO_FLAGS)))
+
+    def __len__(self):
+        if self._tokens is not None:
+            return len(self._tokens)
+        return bin(self._mask).count('1')
+
+    def __bool__(self):
+        return self._mask != 0
+
+    def __contains__(self, token):
+        # The common case of _ordinal_in inlined
+        try:
+            ordinal = token._ordinal
+            if self._container._tokens_by_ordinal[ordinal] is not token:
+                ordinal = _ordinal_in(self._container, token)
+        except (AttributeError, IndexError, TypeError):
+            ordinal = _ordinal_in(self._container, token)
+        return ordinal is not None and (self._mask >> ordinal) & 1 == 1
+
+    def __or__(self, other):
+        if self._same_container(other):
+            return TokenSet.from_mask(self._container, self._mask | other._mask)
+        return super().__or__(other)
+
+    def __and__(self, other):
+        if self._same_container(other):
+            return TokenSet.from_mask(self._container, self._mask & other._mask)
+        return super().__and__(other)
+
+    def __sub__(self, other):
+        if self._same_container(other):
+            return TokenSet.from_mask(self._container, self._mask & ~other._mask)
+        return super().__sub__(other)
+
+    def __xor__(self, other):
+        if self._same_container(other):
+            return TokenSet.from_mask(self._container, self._mask ^ other._mask)
+        return super().__xor__(other)
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __le__(self, other):
+        if self._same_container(other):
+            return self._mask & ~other._mask == 0
+        return super().__le__(other)
+
+    def __ge__(self, other):
+        if self._same_container(other):
+            return other._mask & ~self._mask == 0
+        return super().__ge__(other)
+
+    def __lt__(self, other):
+        if self._same_container(other):
+            return self._mask != other._mask and self <= other
+        return super().__lt__(other)
+
+    def __gt__(self, other):
+        if self._same_container(other):
+            return self._mask != other._mask and self >= other
+        return super().__gt__(other)
+
+    def __eq__(self, other):
+        if self._same_container(other):
+            return self._mask == other._mask
+        return super().__eq__(other)
+
+    def isdisjoint(self, other):
+        if self._same_container(other):
+            return self._mask & other._mask == 0
+        return super().isdisjoint(other)
+
+    def __hash__(self):
+        # The hash of frozenset itself, Set._hash only agrees with it on some Python versions
+        if self._hash_value is None:
+            self._hash_value = hash(frozenset(self))
+        return self._hash_value
+
+    def __reduce__(self):
+        return _unpickle_token_set, (self._container, self._mask)
+
+    def __repr__(self):
+        return f"TokenSet({self._container.__name__}, [{', '.join(token.name for token in self)}])"
+
+
+def _unpickle_token_set(container, mask):
+    return TokenSet.from_mask(container, mask)
+
+
+def _ordinal_in(container, token):
+    """
+    The ordinal of token in container, or None. Tokens carry their ordinal in the container they are declared in,
+    which is used when it is this container, or a base container with the token at the same ordinal. Tokens inherited
+    at another ordinal, equal copies and other values are looked up.
+    """
+    try:
+        ordinal = token._ordinal
+        if container._tokens_by_ordinal[ordinal] is token:
+            return ordinal
+    except (AttributeError, IndexError, TypeError):
+        pass
+    ordinal = container._ordinals_by_id.get(id(token))
+    if ordinal is None and token in container:
+        ordinal = container.ordinal(token)
+    return ordinal
+
+
+# Marks tokens without a value in a TokenMap
+_NOT_SET = object()
+
+
+class TokenMap(MutableMapping):
+    """
+    A mutable mapping with tokens of one container as keys, stored as a list of values indexed by the container
+    ordinals. Iteration is in declaration order. Lookups index the list by the ordinal stored on the token instead
+    of hashing it, and maps pickle as the container, a TokenSet mask and the values.
+
+    With dtype, the values are stored in a NumPy array of that dtype instead, available as the array property.
+    Such a map is dense: every token of the container is a key, with the value fill until set, and keys can't be
+    deleted.
+    """
+
+    __slots__ = ('_container', '_tokens', '_values', '_dense', '_size')
+
+    def __init__(self, container, items=(), *, dtype=None, fill=0):
+        self._container = container
+        self._tokens = container._tokens_by_ordinal
+        self._dense = dtype is not None
+        if self._dense:
+            import numpy
+            self._values = numpy.full(len(container), fill, dtype=dtype)
+        else:
+            self._values = [_NOT_SET] * len(container)
+        # The number of keys, when it is the number of tokens the values can be iterated without checking them
+        self._size = len(self._values) if self._dense else 0
+        self.update(items)
+
+    @property
+    def container(self):
+        return self._container
+
+    @property
+    def array(self):
+        """
+        The NumPy array of values of a dense map, indexed by ordinal
+        """
+        if not self._dense:
+            raise TypeError("Only a TokenMap with a dtype has an array")
+        return self._values
+
+    def _ordinal(self, token):
+        ordinal = _ordinal_in(self._container, token)
+        if ordinal is None:
+            raise KeyError(token)
+        return ordinal
+
+    def __getitem__(self, token):
+        # The common case of _ordinal inlined
+        try:
+            ordinal = token._ordinal
+            if self._tokens[ordinal] is not token:
+                ordinal = self._ordinal(token)
+        except (AttributeError, IndexError, TypeError):
+            ordinal = self._ordinal(token)
+        value = self._values[ordinal]
+        if value is _NOT_SET:
+            raise KeyError(token)
+        return value
+
+    def __setitem__(self, token, value):
+        try:
+            ordinal = token._ordinal
+            if self._tokens[ordinal] is not token:
+                ordinal = self._ordinal(token)
+        except (AttributeError, IndexError, TypeError):
+            ordinal = self._ordinal(token)
+        values = self._values
+        if not self._dense and values[ordinal] is _NOT_SET:
+            self._size += 1
+        values[ordinal] = value
+
+    def __delitem__(self, token):
+        if self._dense:
+            raise TypeError("Can't delete keys of a TokenMap with a dtype")
+        ordinal = self._ordinal(token)
+        if self._values[ordinal] is _NOT_SET:
+            raise KeyError(token)
+        self._values[ordinal] = _NOT_SET
+        self._size -= 1
+
+    def __contains__(self, token):
+        try:
+            ordinal = self._ordinal(token)
+        except KeyError:
+            return False
+        return self._dense or self._values[ordinal] is not _NOT_SET
+
+    def _is_set(self):
+        return map(is_not, self._values, repeat(_NOT_SET))
+
+    def _is_full(self):
+        return self._size == len(self._values)
+
+    def __iter__(self):
+        if self._is_full():
+            return iter(self._tokens)
+        return compress(self._tokens, self._is_set())
+
+    def __len__(self):
+        return self._size
+
+    def items(self):
+        return _TokenMapItems(self)
+
+    def values(self):
+        return _TokenMapValues(self)
+
+    def _items(self):
+        items = zip(self._tokens, self._values)
+        if self._is_full():
+            return items
+        return compress(items, self._is_set())
+
+    def clear(self):
+        if self._dense:
+            raise TypeError("Can't delete keys of a TokenMap with a dtype")
+        self._values = [_NOT_SET] * len(self._container)
+        self._size = 0
+
+    def copy(self):
+        result = TokenMap.__new__(TokenMap)
+        result._container = self._container
+        result._tokens = self._tokens
+        result._dense = self._dense
+        result._values = self._values.copy()
+        result._size = self._size
+        return result
+
+    def __reduce__(self):
+        if self._dense:
+            return _unpickle_token_map, (self._container, None, self._values)
+        keys = TokenSet(self._container, self)
+        return _unpickle_token_map, (self._container, keys.mask, tuple(value for value in self._values if value is not _NOT_SET))
+
+    def __repr__(self):
+        return f"TokenMap({self._container.__name__}, {{{', '.join(f'{token.name}: {value!r}' for token, value in self.items())}}})"
+
+
+class _TokenMapItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._items()
+
+
+class _TokenMapValues(ValuesView):
+    def __iter__(self):
+        mapping = self._mapping
+        if mapping._is_full():
+            return iter(mapping._values)
+        return compress(mapping._values, mapping._is_set())
+
+
+def _unpickle_token_map(container, mask, values):
+    result = TokenMap.__new__(TokenMap)
+    result._container = container
+    result._tokens = container._tokens_by_ordinal
+    result._dense = mask is None
+    result._size = len(values)
+    if result._dense:
+        result._values = values
+    else:
+        result._values = [_NOT_SET] * len(container)
+        for token, value in zip(TokenSet.from_mask(container, mask), values):
+            result._values[container.ordinal(token)] = value
+    return result
+
+
+def _write_chunks(out, chunks):
+    if isinstance(out, (RawIOBase, BufferedIOBase)):
+        out = TextIOWrapper(out, encoding='utf8', newline='')
+        try:
+            out.writelines(chunks)
+        finally:
+            # Leave the binary stream open for the caller
+            out.detach()
+    else:
+        out.writelines(chunks)
+
+
+def _rst_cell_lines(value):
+    value = str(value or '').replace('\\', '\\\\').replace('`', '\\`').replace('*', '\\*')
+    # Carriage returns break lines like newlines, and tabs are expanded to fixed tab stops in each line, as
+    # prettytable did
+    value = value.strip().replace('\r\n', '\n').replace('\r', '\n')
+    return [line.expandtabs() for line in value.split('\n')]
+
+
+def _display_width(line):
+    """
+    The number of columns line takes in a monospaced font: East Asian wide characters take two, combining and
+    format characters none
+    """
+    width = 0
+    for c in line:
+        if unicodedata.east_asian_width(c) in ('W', 'F'):
+            width += 2
+        elif unicodedata.category(c) not in ('Mn', 'Me', 'Cf'):
+            width += 1
+    return width
+
+
+def _rst_center(line, width):
+    # Split the padding like str.center, by display width
+    padding = width - _display_width(line)
+    left = padding // 2 + (padding & width & 1)
+    return ' ' * left + line + ' ' * (padding - left)
+
+
+def _rst_row_lines(cells, widths):
+    for i in range(max(len(cell) for cell in cells)):
+        yield '|' + '|'.join(
+            ' ' + _rst_center(cell[i] if i < len(cell) else '', width) + ' '
+            for cell, width in zip(cells, widths)
+        ) + '|\n'
+
+
+def enable_profiling():
+    """
+    Start collecting a new Profile of container creation, derived attribute values and validation.
+
+    Validation is profiled by replacing Token._validate and TokenContainer._validate until profiling is disabled,
+    so that it costs nothing otherwise. Validators already handed out, e.g. to pydantic models, are not profiled.
+    """
+    global _profile
+    _profile = Profile()
+    for owner in (Token, TokenContainer):
+        validate = owner.__dict__['_validate'].__func__
+        if not hasattr(validate, '_unprofiled'):
+            owner._validate = classmethod(_profiled_validate(validate))
+    return _profile
+
+
+def disable_profiling():
+    """
+    Stop profiling, returning the Profile collected so far
+    """
+    global _profile
+    profile, _profile = _profile, None
+    for owner in (Token, TokenContainer):
+        validate = owner.__dict__['_validate'].__func__
+        if hasattr(validate, '_unprofiled'):
+            owner._validate = classmethod(validate._unprofiled)
+    return profile
+
+
+def _profiled_validate(validate):
+    def profiled_validate(cls, value):
+        profile = _profile
+        if profile is None:
+            return validate(cls, value)
+        return profile.validate(cls, validate, value)
+    profiled_validate._unprofiled = validate
+    return profiled_validate
+
+
+def get_profile():
+    """
+    The Profile being collected, or None if profiling is disabled
+    """
+    return _profile
+
+
+def _write_profile_report(destination):
+    profile = get_profile()
+    if profile is None:
+        return
+    if destination == '1':
+        sys.stderr.write(profile.report())
+    else:
+        with open(destination, 'w') as f:
+            f.write(profile.report())
+
+
+if os.environ.get('TRI_TOKEN_PROFILE', '0') not in ('', '0'):  # pragma: no cover
+    enable_profiling()
+    atexit.register(_write_profile_report, os.environ['TRI_TOKEN_PROFILE'])
+
+
 def generate_documentation(token_container):  # pragma: no cover
     import argparse
     parser = argparse.ArgumentParser(description='Generate documentation of fields.')  # pragma: no mutate
@@ -0,0 +1,323 @@
+"""
+A read-only catalog of containers in one file, for processes that look tokens up without creating the containers.
+
+`write_catalog(path, containers)` stores the attribute values of the tokens of the containers once, when they are
+built. Worker processes open the file with `Catalog(path)`, which memory maps it, and look tokens up by name or
+ordinal. The pages of the file are shared by all processes that map it and never written to, so they stay shared
+after fork, and a process that never imports the containers does not pay for their tokens.
+
+The file starts with the magic bytes, the format version and the length of a JSON table of contents, followed by the
+table of contents and the sections it points to, each aligned to 8 bytes:
+
+- the string table, all distinct values as UTF-8 and an array of their start offsets
+- per container an open addressing hash table from name to ordinal, by crc32 of the name
+- per container and attribute an array of string table indexes and an array of value types, by ordinal
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from tempfile import NamedTemporaryFile
+from zlib import crc32
+
+from tri_token import PRESENT
+
+MAGIC = b'TRITOKEN'
+FORMAT = 1
+
+# Types of attribute values, stored next to their string table index
+_NONE, _PRESENT, _STR, _INT, _FLOAT, _BOOL = range(6)
+
+_ENCODERS = {
+    str: (_STR, str),
+    int: (_INT, str),
+    float: (_FLOAT, repr),
+    bool: (_BOOL, lambda value: 'True' if value else ''),
+}
+
+_DECODERS = {
+    _STR: str,
+    _INT: int,
+    _FLOAT: float,
+    _BOOL: bool,
+}
+
+
+def _container_key(container):
+    return f'{container.__module__}.{container.__qualname__}'
+
+
+def _table_size(count):
+    # A power of two at least twice the number of names, so probe sequences stay short
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+
+def write_catalog(path, containers, attributes=None):
+    """
+    Write the tokens of containers to a catalog file at path, replacing it atomically.
+
+    attributes are the names of the token attributes to store, by default all of them. Values can be str, int,
+    float, bool, None and PRESENT, anything else is a TypeError.
+    """
+    strings = {}
+    sections = []  # Arrays in file order
+    offset = 0
+
+    def add_section(values):
+        nonlocal offset
+        sections.append(values)
+        start = offset
+        offset += -(-len(values) * values.itemsize // 8) * 8
+        return [start, len(values)]
+
+    def string_index(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    toc = dict(byteorder=sys.byteorder, containers={})
+    for container in containers:
+        tokens = container._tokens_by_ordinal
+        names = list(attributes or dict.fromkeys(a for token in tokens for a in token._token_attributes))
+        if 'name' not in names:
+            names.insert(0, 'name')
+
+        columns = {}
+        for attribute in names:
+            indexes = array('I')
+            types = array('B')
+            for token in tokens:
+                value = getattr(token, attribute, None)
+                if value is None:
+                    value_type, string = _NONE, ''
+                elif value is PRESENT:
+                    value_type, string = _PRESENT, ''
+                else:
+                    encoder = _ENCODERS.get(type(value))
+                    if encoder is None:
+                        raise TypeError(
+                            f'{container.__name__}.{token.name}.{attribute} is a {type(value).__name__}, a catalog '
+                            f'holds str, int, float, bool, None and PRESENT values'
+                        )
+                    value_type, encode = encoder
+                    string = encode(value)
+                indexes.append(string_index(string))
+                types.append(value_type)
+            columns[attribute] = add_section(indexes) + add_section(types)
+
+        table = array('I', bytes(4 * _table_size(len(tokens))))
+        mask = len(table) - 1
+        for ordinal, token in enumerate(tokens):
+            slot = crc32(token.name.encode('utf8')) & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            # Zero marks an empty slot
+            table[slot] = ordinal + 1
+
+        toc['containers'][_container_key(container)] = dict(
+            count=len(tokens),
+            table=add_section(table),
+            columns=columns,
+        )
+
+    encoded = [string.encode('utf8') for string in strings]
+    string_offsets = array('Q', [0])
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    toc['string_offsets'] = add_section(string_offsets)
+    toc['strings'] = [offset, string_offsets[-1]]
+
+    toc_bytes = json.dumps(toc).encode('utf8')
+    data_start = -(-(len(MAGIC) + 8 + len(toc_bytes)) // 8) * 8
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+        try:
+            f.write(MAGIC)
+            f.write(array('I', [FORMAT, len(toc_bytes)]).tobytes())
+            f.write(toc_bytes)
+            f.write(bytes(data_start - f.tell()))
+            for section in sections:
+                data = section.tobytes()
+                f.write(data)
+                f.write(bytes(-len(data) % 8))
+            for string in encoded:
+                f.write(string)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+class Catalog:
+    """
+    A catalog file written by write_catalog, memory mapped. Containers are looked up by module and qualified name,
+    or by the container class itself:
+
+        catalog = Catalog('tokens.catalog')
+        colors = catalog[Colors]
+        colors.ordinal('red'), colors.value('red', 'display_name')
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        # Every view into the map, released by close()
+        self._views = [view]
+        if view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a token catalog')
+        version, toc_length = view[len(MAGIC):len(MAGIC) + 8].cast('I')
+        start = len(MAGIC) + 8
+        toc = json.loads(str(view[start:start + toc_length], 'utf8'))
+        if version != FORMAT or toc['byteorder'] != sys.byteorder:
+            self.close()
+            raise ValueError(f'{path} is a token catalog in another format')
+
+        data = view[-(-(start + toc_length) // 8) * 8:]
+        self._views.append(data)
+
+        def section(typecode, location):
+            section_start, count = location
+            itemsize = array(typecode).itemsize
+            section_view = data[section_start:section_start + count * itemsize].cast(typecode)
+            self._views.append(section_view)
+            return section_view
+
+        self._string_offsets = section('Q', toc['string_offsets'])
+        strings_start, strings_length = toc['strings']
+        self._strings = data[strings_start:strings_start + strings_length]
+        self._views.append(self._strings)
+        self.containers = {
+            key: CatalogContainer(
+                self,
+                key,
+                entry['count'],
+                section('I', entry['table']),
+                {
+                    attribute: (section('I', location[:2]), section('B', location[2:]))
+                    for attribute, location in entry['columns'].items()
+                },
+            )
+            for key, entry in toc['containers'].items()
+        }
+
+    def __getitem__(self, container):
+        if not isinstance(container, str):
+            container = _container_key(container)
+        return self.containers[container]
+
+    def __contains__(self, container):
+        if not isinstance(container, str):
+            container = _container_key(container)
+        return container in self.containers
+
+    def _string(self, index):
+        start = self._string_offsets[index]
+        end = self._string_offsets[index + 1]
+        return str(self._strings[start:end], 'utf8')
+
+    def close(self):
+        # The views into the map have to go before it can be closed. Containers taken from the catalog
+        # can not be used after this.
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.containers = {}
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class CatalogContainer:
+    """
+    The tokens of one container in a Catalog, by ordinal. Tokens are given by name or ordinal.
+    """
+
+    def __init__(self, catalog, key, count, table, columns):
+        self.catalog = catalog
+        self.key = key
+        self._count = count
+        self._table = table
+        self._mask = len(table) - 1
+        self._columns = columns
+        self._names, _ = columns['name']
+
+    @property
+    def attributes(self):
+        return tuple(self._columns)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self.name(ordinal) for ordinal in range(self._count))
+
+    def __contains__(self, name):
+        return self.ordinal(name) is not None
+
+    def name(self, ordinal):
+        return self.catalog._string(self._names[ordinal])
+
+    def ordinal(self, name):
+        """
+        The ordinal of the token named name, or None
+        """
+        if not isinstance(name, str):
+            return None
+        encoded = name.encode('utf8')
+        strings = self.catalog._strings
+        offsets = self.catalog._string_offsets
+        names = self._names
+        table = self._table
+        mask = self._mask
+        slot = crc32(encoded) & mask
+        while True:
+            entry = table[slot]
+            if not entry:
+                return None
+            index = names[entry - 1]
+            if strings[offsets[index]:offsets[index + 1]] == encoded:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def _ordinal(self, token):
+        if isinstance(token, int):
+            if not 0 <= token < self._count:
+                raise IndexError(f'{self.key} has no ordinal {token}')
+            return token
+        ordinal = self.ordinal(token)
+        if ordinal is None:
+            raise KeyError(token)
+        return ordinal
+
+    def value(self, token, attribute):
+        """
+        The value of attribute of a token, given by name or ordinal
+        """
+        ordinal = self._ordinal(token)
+        indexes, types = self._columns[attribute]
+        value_type = types[ordinal]
+        if value_type == _NONE:
+            return None
+        if value_type == _PRESENT:
+            return PRESENT
+        return _DECODERS[value_type](self.catalog._string(indexes[ordinal]))
+
+    def record(self, token):
+        """
+        All stored attribute values of a token, given by name or ordinal, as a dict
+        """
+        ordinal = self._ordinal(token)
+        return {attribute: self.value(ordinal, attribute) for attribute in self._columns}
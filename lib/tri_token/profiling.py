@@ -0,0 +1,107 @@
+"""
+Timings of container creation, derived attribute values and validation, collected while profiling is enabled.
+
+Enable with `tri_token.enable_profiling()`, or by setting the environment variable TRI_TOKEN_PROFILE before
+tri_token is imported. With TRI_TOKEN_PROFILE set to a file name the report is written there when the process
+exits, with any other non empty value (except 0) to stderr.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import (
+    Lock,
+    local,
+)
+from time import perf_counter
+
+
+@dataclass
+class ContainerProfile:
+    name: str
+    tokens: int = 0
+    seconds: float = 0.0
+    # Time spent in value and optional_value callables while the container was created
+    derivation_seconds: float = 0.0
+
+
+@dataclass
+class CallProfile:
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class Profile:
+    """
+    containers holds a ContainerProfile per created container, in creation order. derivations holds a CallProfile
+    per 'TokenClass.attribute' for the value and optional_value callables, validations one per Token class or
+    container for _validate.
+    """
+
+    def __init__(self):
+        self.containers = []
+        self.derivations = {}
+        self.validations = {}
+        self._lock = Lock()
+        self._creating = local()
+
+    @contextmanager
+    def creating(self, container):
+        stack = self._creating.__dict__.setdefault('stack', [])
+        container_profile = ContainerProfile(name=f'{container.__module__}.{container.__qualname__}')
+        stack.append(container_profile)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            container_profile.seconds = perf_counter() - start
+            container_profile.tokens = len(getattr(container, 'tokens', ()))
+            stack.pop()
+            with self._lock:
+                self.containers.append(container_profile)
+
+    def derive(self, token, name, function, values):
+        start = perf_counter()
+        try:
+            return function(**values)
+        finally:
+            seconds = perf_counter() - start
+            stack = getattr(self._creating, 'stack', None)
+            with self._lock:
+                self._record(self.derivations, f'{type(token).__name__}.{name}', seconds)
+                if stack:
+                    stack[-1].derivation_seconds += seconds
+
+    def validate(self, owner, function, value):
+        start = perf_counter()
+        try:
+            return function(owner, value)
+        finally:
+            seconds = perf_counter() - start
+            with self._lock:
+                self._record(self.validations, owner.__name__, seconds)
+
+    @staticmethod
+    def _record(call_profiles, key, seconds):
+        call_profile = call_profiles.get(key)
+        if call_profile is None:
+            call_profile = call_profiles[key] = CallProfile()
+        call_profile.calls += 1
+        call_profile.seconds += seconds
+
+    def report(self):
+        """
+        The profile as text, slowest first in each section
+        """
+        lines = [
+            'Containers',
+            f'{"ms":>10} {"derive ms":>10} {"tokens":>8}  name',
+        ]
+        for container_profile in sorted(self.containers, key=lambda c: -c.seconds):
+            lines.append(
+                f'{container_profile.seconds * 1000:10.3f} {container_profile.derivation_seconds * 1000:10.3f} '
+                f'{container_profile.tokens:8}  {container_profile.name}'
+            )
+        for title, call_profiles in [('Derived attributes', self.derivations), ('Validation', self.validations)]:
+            lines += ['', title, f'{"ms":>10} {"calls":>8}  name']
+            for key, call_profile in sorted(call_profiles.items(), key=lambda item: -item[1].seconds):
+                lines.append(f'{call_profile.seconds * 1000:10.3f} {call_profile.calls:8}  {key}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+
+import pytest
+
+from tri_token import (
+    PRESENT,
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+from tri_token.catalog import (
+    Catalog,
+    write_catalog,
+)
+
+
+class CatalogToken(Token):
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, **_: name.title())
+    ratio = TokenAttribute()
+    flag = TokenAttribute()
+    home = TokenAttribute(optional_value=lambda **_: None)
+
+
+def make_container(count):
+    return TokenContainerMeta('CatalogTokens', (TokenContainer,), {
+        '__module__': __name__,
+        '__qualname__': 'CatalogTokens',
+        **{
+            f'token_{i}': CatalogToken(code=i, ratio=i / 4, flag=i % 2 == 0, home=PRESENT if i % 3 else None)
+            for i in range(count)
+        }
+    })
+
+
+def test_catalog(tmp_path):
+    CatalogTokens = make_container(1000)
+    path = tmp_path / 'tokens.catalog'
+    write_catalog(path, [CatalogTokens])
+
+    with Catalog(path) as catalog:
+        assert CatalogTokens in catalog
+        assert list(catalog.containers) == ['tests.test_catalog.CatalogTokens']
+        tokens = catalog[CatalogTokens]
+        assert len(tokens) == 1000
+        assert tokens.attributes == ('name', 'code', 'label', 'ratio', 'flag', 'home')
+        assert list(tokens)[:2] == ['token_0', 'token_1']
+        for ordinal, token in enumerate(CatalogTokens):
+            assert tokens.ordinal(token.name) == ordinal
+            assert tokens.record(ordinal) == {attribute: getattr(token, attribute) for attribute in tokens.attributes}
+        assert tokens.value('token_3', 'home') is None
+        assert tokens.value('token_4', 'home') is PRESENT
+        assert tokens.ordinal('token_1000') is None
+        assert 'token_1000' not in tokens
+        with pytest.raises(KeyError):
+            tokens.value('token_1000', 'code')
+        with pytest.raises(IndexError):
+            tokens.value(1000, 'code')
+
+    with pytest.raises(ValueError):
+        tokens.ordinal('token_1')
+
+
+def test_catalog_rejects_other_values(tmp_path):
+    class OtherTokens(TokenContainer):
+        foo = CatalogToken(code=(1, 2))
+
+    with pytest.raises(TypeError) as e:
+        write_catalog(tmp_path / 'tokens.catalog', [OtherTokens])
+    assert str(e.value) == 'OtherTokens.foo.code is a tuple, a catalog holds str, int, float, bool, None and PRESENT values'
+
+    (tmp_path / 'not.catalog').write_bytes(b'something else')
+    with pytest.raises(ValueError):
+        Catalog(tmp_path / 'not.catalog')
+
+
+def private_bytes():
+    with open('/proc/self/smaps_rollup') as f:
+        return sum(int(line.split()[1]) * 1024 for line in f if line.startswith(('Private_Clean', 'Private_Dirty')))
+
+
+def build_in_worker(count):
+    before = private_bytes()
+    container = make_container(count)
+    assert container.token_5.label == 'Token_5'
+    return private_bytes() - before
+
+
+def attach_in_worker(path):
+    before = private_bytes()
+    with Catalog(path) as catalog:
+        tokens = catalog['tests.test_catalog.CatalogTokens']
+        assert all(tokens.value(f'token_{i}', 'code') == i for i in range(0, len(tokens), 7))
+        used = private_bytes() - before
+    return used
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason='Needs Linux /proc/self/smaps_rollup')
+def test_catalog_uses_less_private_memory_in_workers(tmp_path):
+    count = 20_000
+    workers = 2
+    path = str(tmp_path / 'tokens.catalog')
+    write_catalog(path, [make_container(count)])
+
+    # Every measurement in a fresh process, attaching in a worker that built and freed a container before would
+    # reuse its already dirty memory and look cheaper than it is
+    with multiprocessing.get_context('spawn').Pool(workers, maxtasksperchild=1) as pool:
+        built = pool.map(build_in_worker, [count] * workers, chunksize=1)
+        attached = pool.map(attach_in_worker, [path] * workers, chunksize=1)
+
+    # Creating the tokens costs each worker megabytes, the catalog pages are shared with the page cache
+    assert min(built) > 1_000_000
+    assert max(attached) * 4 < min(built)
@@ -1,16 +1,28 @@
+import os
 import pickle
+import sys
 from copy import (
     copy,
     deepcopy,
 )
+from io import (
+    BytesIO,
+    StringIO,
+)
 
 import pytest
 
 from tri_token import (
     PRESENT,
+    disable_profiling,
+    enable_profiling,
+    get_profile,
     Token,
     TokenAttribute,
     TokenContainer,
+    TokenContainerMeta,
+    TokenMap,
+    TokenSet,
 )
 
 
@@ -42,6 +54,21 @@ def test_in():
         boink = MyToken()
 
     assert MyTokens.foo in OtherTokens
+    assert OtherTokens.boink not in MyTokens
+
+    assert pickle.loads(pickle.dumps(MyTokens.foo)) in MyTokens
+    assert 'foo' not in MyTokens
+    assert [] not in MyTokens
+    assert MyToken(name='foo') in MyTokens
+
+
+def test_in_with_override():
+    class OverridingTokens(MyTokens):
+        foo = MyToken(__override__=True, stuff='Override')
+
+    assert OverridingTokens.foo in OverridingTokens
+    assert MyTokens.foo not in OverridingTokens
+    assert MyTokens.bar in OverridingTokens
 
 
 def test_immutable():
@@ -78,8 +105,28 @@ def test_pickle():
     assert result._index == MyTokens.foo._index
     assert result._container == MyTokens.foo._container
     assert hash(result) == hash(MyTokens.foo)
-    # Identity not retained after pickle. Would need to crawl _container and name in some way.
-    # assert result is MyTokens.foo
+    assert result is MyTokens.foo
+
+    assert pickle.loads(pickle.dumps(CompactTokens.bar, 0)) is CompactTokens.bar
+    assert pickle.loads(pickle.dumps(list(MyTokens), pickle.HIGHEST_PROTOCOL)) == list(MyTokens)
+
+
+def test_pickle_not_importable_container():
+
+    class LocalTokens(TokenContainer):
+        foo = MyToken(stuff='Hello')
+
+    result = pickle.loads(pickle.dumps(LocalTokens.foo, pickle.HIGHEST_PROTOCOL))
+    assert result is not LocalTokens.foo
+    assert result == LocalTokens.foo
+    assert hash(result) == hash(LocalTokens.foo)
+    assert (result.name, result.stuff, result._index) == ('foo', 'Hello', LocalTokens.foo._index)
+
+    class OverridingTokens(MyTokens):
+        foo = MyToken(__override__=True, stuff='Override')
+
+    assert pickle.loads(pickle.dumps(OverridingTokens.bar)) is MyTokens.bar
+    assert pickle.loads(pickle.dumps(OverridingTokens.foo)) == OverridingTokens.foo
 
 
 def test_pickle_baseclass_use():
@@ -152,6 +199,24 @@ def test_str():
     assert str(list(MyTokens)) == "[<MyToken: foo>, <MyToken: bar>, <MyToken: baz>]"
 
 
+def test_qualified_name():
+    class PrefixedToken(Token):
+        prefix = TokenAttribute()
+
+    class PrefixedTokens(TokenContainer):
+        class Meta:
+            prefix = 'pre'
+
+        foo = PrefixedToken()
+
+    assert MyToken().qualified_name is None
+    assert MyTokens.foo.qualified_name == 'foo'
+    assert PrefixedTokens.foo.qualified_name == 'pre.foo'
+    assert PrefixedTokens.foo.qualified_name is sys.intern('pre.foo')
+    assert str(PrefixedTokens.foo) is PrefixedTokens.foo.qualified_name
+    assert repr(PrefixedTokens.foo) is repr(PrefixedTokens.foo)
+
+
 def test_type_str():
     assert "<class 'tests.test_tokens.MyToken'>" == str(MyToken)
     assert "<class 'tests.test_tokens.MyToken'>" == str(type(MyTokens.foo))
@@ -217,6 +282,54 @@ def test_container_inheritance_override():
     assert MoreTokens.foo.stuff == 'Override'
 
 
+def test_indexes():
+    class IndexedToken(Token):
+        code = TokenAttribute()
+        color = TokenAttribute()
+        size = TokenAttribute()
+
+    class IndexedTokens(TokenContainer):
+        class Meta:
+            unique_indexes = ['code']
+            indexes = ['color', 'size']
+
+        apple = IndexedToken(code=1, color='red', size='small')
+        cherry = IndexedToken(code=2, color='red', size='tiny')
+        banana = IndexedToken(code=3, color='yellow', size='small')
+        grape = IndexedToken(color='green', size='tiny')
+
+    assert IndexedTokens.by('code', 2) is IndexedTokens.cherry
+    assert IndexedTokens.by('code', 17) is None
+    assert IndexedTokens.by('name', 'banana') is IndexedTokens.banana
+    assert IndexedTokens.by('color', 'red') == (IndexedTokens.apple, IndexedTokens.cherry)
+    assert IndexedTokens.by('color', 'blue') == ()
+
+    with pytest.raises(ValueError) as e:
+        IndexedTokens.by('bogus', 'red')
+    assert str(e.value) == 'bogus is not an indexed attribute of IndexedTokens'
+
+    assert IndexedTokens.filter(color='red', size='tiny') == (IndexedTokens.cherry,)
+    assert IndexedTokens.filter(size='tiny', color='red') == (IndexedTokens.cherry,)
+    assert IndexedTokens.filter(size='small') == (IndexedTokens.apple, IndexedTokens.banana)
+    assert IndexedTokens.filter(size='small', code=3) == (IndexedTokens.banana,)
+    assert IndexedTokens.filter(code=None) == (IndexedTokens.grape,)
+    assert IndexedTokens.filter(name='grape', code=None) == (IndexedTokens.grape,)
+    assert IndexedTokens.filter(color='red', prefix=None) == (IndexedTokens.apple, IndexedTokens.cherry)
+    assert IndexedTokens.filter() == tuple(IndexedTokens)
+
+    class MoreIndexedTokens(IndexedTokens):
+        kiwi = IndexedToken(code=4, color='green', size='small')
+
+    assert MoreIndexedTokens.by('code', 4) is MoreIndexedTokens.kiwi
+    assert MoreIndexedTokens.by('color', 'green') == (IndexedTokens.grape, MoreIndexedTokens.kiwi)
+
+    with pytest.raises(TypeError) as e:
+        class DuplicateTokens(IndexedTokens):
+            kiwi = IndexedToken(code=1)
+
+    assert str(e.value) == 'Duplicate value 1 of unique index code in DuplicateTokens: apple and kiwi'
+
+
 def test_token_without_subclassing():
 
     class TestTokens(TokenContainer):
@@ -434,6 +547,45 @@ foo,Hello\r
 """
 
 
+def test_ordered():
+    calls = []
+
+    def sort_key(token):
+        calls.append(token)
+        return token.stuff
+
+    class TestTokensWithSortOrder(MyTokens):
+        class Meta:
+            documentation_sort_key = sort_key
+
+    assert calls == []
+    assert TestTokensWithSortOrder.ordered() == (MyTokens.baz, MyTokens.foo, MyTokens.bar)
+    assert TestTokensWithSortOrder.ordered() is TestTokensWithSortOrder.ordered()
+    assert len(calls) == 3
+
+    assert TestTokensWithSortOrder.ordered(sort_key) is TestTokensWithSortOrder.ordered()
+    assert len(calls) == 3
+
+    by_name = lambda token: token.name
+    assert TestTokensWithSortOrder.ordered(by_name) == (MyTokens.bar, MyTokens.baz, MyTokens.foo)
+
+    class UnhashableSortKey:
+        __hash__ = None
+
+        def __call__(self, token):
+            return token.name
+
+    assert TestTokensWithSortOrder.ordered(UnhashableSortKey()) == (MyTokens.bar, MyTokens.baz, MyTokens.foo)
+    assert TestTokensWithSortOrder.to_csv(sort_key=UnhashableSortKey()).startswith('name\r\nbar\r\n')
+
+    assert MyTokens.ordered() is MyTokens.ordered()
+    assert MyTokens.ordered() == tuple(MyTokens)
+
+    tokens = MyTokens.in_documentation_order()
+    tokens.reverse()
+    assert MyTokens.in_documentation_order() == list(MyTokens)
+
+
 def test_to_csv():
     class TestTokensWithDocumentation(MyTokens):
         baz = Token(__override__=True, stuff=None)
@@ -468,6 +620,75 @@ def test_to_rst():
 +------+-------+"""
 
 
+def test_to_rst_multiline_and_markup():
+    class DocumentedTokens(TokenContainer):
+        foo = MyToken(stuff='Hello\nsome *strong*\nWorld')
+        bar = MyToken(stuff='`code`')
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+    assert DocumentedTokens.to_rst() == r"""
++------+-----------------+
+| name |      stuff      |
++======+=================+
+| foo  |      Hello      |
+|      | some \*strong\* |
+|      |      World      |
++------+-----------------+
+| bar  |     \`code\`    |
++------+-----------------+"""[1:]
+
+
+def test_to_rst_wide_characters_tabs_and_carriage_returns():
+    class DocumentedTokens(TokenContainer):
+        foo = MyToken(stuff='日本語テキスト')
+        bar = MyToken(stuff='a\tb\r\nc\rd')
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+    assert DocumentedTokens.to_rst() == """
++------+----------------+
+| name |     stuff      |
++======+================+
+| foo  | 日本語テキスト |
++------+----------------+
+| bar  |   a       b    |
+|      |       c        |
+|      |       d        |
++------+----------------+"""[1:]
+
+
+def test_write_documentation_to_streams():
+    class TestTokensWithDocumentation(MyTokens):
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+    for format in ['csv', 'confluence', 'rst']:
+        text = StringIO()
+        getattr(TestTokensWithDocumentation, f'write_{format}')(text)
+        assert text.getvalue().rstrip('\n') == getattr(TestTokensWithDocumentation, f'to_{format}')().rstrip('\n')
+        assert ''.join(getattr(TestTokensWithDocumentation, f'iter_{format}')()) == text.getvalue()
+
+        binary = BytesIO()
+        getattr(TestTokensWithDocumentation, f'write_{format}')(binary)
+        assert not binary.closed
+        assert binary.getvalue() == text.getvalue().encode('utf8')
+
+
+def test_to_columns():
+    class TestTokensWithDocumentation(MyTokens):
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+            documentation_sort_key = lambda token: token.name
+
+    assert TestTokensWithDocumentation.to_columns() == {'name': ['bar', 'baz', 'foo'], 'stuff': ['World', '', 'Hello']}
+    assert TestTokensWithDocumentation.to_columns(['stuff']) == {'stuff': ['World', '', 'Hello']}
+
+
 def test_to_confluence():
     class TestTokensWithDocumentation(MyTokens):
 
@@ -514,3 +735,574 @@ def test_compare_with_other_type():
 
 def test_hash_on_ad_hoc_token():
     assert hash(Token(foo=1)) != hash(Token(foo=2))
+
+
+def test_generated_constructor():
+
+    class GeneratedToken(Token):
+        name = TokenAttribute()
+        stuff = TokenAttribute(default='default stuff')
+        derived = TokenAttribute(value=lambda name, stuff, **_: f'{name} {stuff}')
+
+    class SubGeneratedToken(GeneratedToken):
+        more = TokenAttribute()
+
+    class HandWrittenToken(GeneratedToken):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+
+    token = GeneratedToken(name='foo')
+    assert GeneratedToken.__init__._token_class is GeneratedToken
+    assert (token.name, token.stuff, token.derived) == ('foo', 'default stuff', 'foo default stuff')
+    assert GeneratedToken(name='foo', stuff='bar').derived == 'foo bar'
+
+    sub_token = SubGeneratedToken(name='foo', more=17)
+    assert SubGeneratedToken.__init__._token_class is SubGeneratedToken
+    assert (sub_token.derived, sub_token.more) == ('foo default stuff', 17)
+
+    hand_written = HandWrittenToken(name='foo')
+    assert not hasattr(HandWrittenToken.__init__, '_token_class')
+    assert vars(hand_written) == vars(token)
+
+    with pytest.raises(AssertionError) as e:
+        GeneratedToken(unknown=1)
+    assert "Unexpected constructor arguments: {'unknown': 1}" == str(e.value)
+
+
+class CompactToken(Token):
+    __compact__ = True
+
+    name = TokenAttribute()
+    stuff = TokenAttribute()
+    derived = TokenAttribute(value=lambda name, **_: name.upper())
+
+
+class SubCompactToken(CompactToken):
+    more = TokenAttribute()
+
+
+class CompactTokens(TokenContainer):
+    foo = CompactToken(stuff='Hello')
+    bar = SubCompactToken(more=17)
+
+
+def test_compact_token():
+    assert CompactToken.attribute_names() == ('name', 'stuff', 'derived')
+    assert SubCompactToken.attribute_names() == ('name', 'stuff', 'derived', 'more')
+    assert SubCompactToken.__slots__ == ('more', )
+
+    foo = CompactTokens.foo
+    assert (foo.name, foo.stuff, foo.derived) == ('foo', 'Hello', 'FOO')
+    assert (CompactTokens.bar.derived, CompactTokens.bar.more) == ('BAR', 17)
+    assert vars(foo) == {}
+
+    with pytest.raises(TypeError):
+        foo.stuff = 'Not likely'
+
+    with pytest.raises(TypeError):
+        del foo.stuff
+
+    assert {foo: 17}[foo] == 17
+    assert foo != CompactTokens.bar
+    assert str(foo) == 'foo'
+
+    result = pickle.loads(pickle.dumps(foo, pickle.HIGHEST_PROTOCOL))
+    assert result == foo
+    assert hash(result) == hash(foo)
+    assert result.derived == 'FOO'
+
+
+def test_validate_many():
+    assert MyToken.validate_many(['foo', 'bar', 'foo', MyTokens.baz]) == [MyTokens.foo, MyTokens.bar, MyTokens.foo, MyTokens.baz]
+    assert MyTokens.validate_many(iter(['baz', MyTokens.foo])) == [MyTokens.baz, MyTokens.foo]
+
+    with pytest.raises(ValueError) as e:
+        MyToken.validate_many(['foo', 'nope', 17, 'nope', [], 'bar'])
+
+    assert str(e.value) == '\n'.join([
+        "nope is not a valid value for MyToken",
+        "Given 'int' expected either an instance of 'MyToken' or 'str'",
+        "Given 'list' expected either an instance of 'MyToken' or 'str'",
+    ])
+
+    class OtherTokens(TokenContainer):
+        boink = MyToken()
+
+    with pytest.raises(ValueError) as e:
+        MyTokens.validate_many(['foo', OtherTokens.boink, 'boink'])
+
+    assert str(e.value) == "boink is not a valid value for MyTokens"
+
+
+def test_resolve_names():
+    class Color(Token):
+        prefix = TokenAttribute()
+        code = TokenAttribute()
+
+    class Colors(TokenContainer):
+        class Meta:
+            prefix = 'color'
+
+        red = Color()
+        green = Color()
+        greenish_blue = Color()
+        Greenish_Blue = Color()
+
+    class MoreColors(Colors):
+        class Meta:
+            prefix = 'more'
+
+        blue = Color()
+
+    assert Colors.resolve('red') is Colors.red
+    assert Colors.resolve('RED') is Colors.red
+    assert Colors.resolve('color.green') is Colors.green
+    assert Colors.resolve('Color.Green') is Colors.green
+    assert Colors.resolve('Greenish_Blue') is Colors.Greenish_Blue
+    assert Colors.resolve('GREENISH_BLUE') is None
+    assert Colors.resolve('blue') is None
+    assert Colors.resolve('blue', 'default') == 'default'
+    assert Colors.resolve(17) is None
+    assert MoreColors.resolve('more.blue') is MoreColors.blue
+    assert MoreColors.resolve('color.red') is Colors.red
+
+    assert Colors.with_prefix('gre') == (Colors.green, Colors.greenish_blue, Colors.Greenish_Blue)
+    assert Colors.with_prefix('GREENISH') == (Colors.greenish_blue, Colors.Greenish_Blue)
+    assert Colors.with_prefix('color.r') == (Colors.red,)
+    assert Colors.with_prefix('x') == ()
+    assert MoreColors.with_prefix('') == tuple(sorted(MoreColors, key=lambda token: token.name.casefold()))
+
+    assert Colors.suggest('gren') == (Colors.green,)
+    assert Colors.suggest('purple') == ()
+
+    assert Color.resolve('Blue') is MoreColors.blue
+    assert Color.resolve('red') is Colors.red
+    assert Color.with_prefix('b') == (MoreColors.blue,)
+
+    class OtherColors(TokenContainer):
+        red = Color()
+        yellow = Color()
+
+    assert Color.resolve('yellow') is OtherColors.yellow
+    assert Color.resolve('red') is None
+
+    with pytest.raises(ValueError) as e:
+        Colors.validate_many(['gren', 'purple'])
+    assert str(e.value) == "gren is not a valid value for Colors\npurple is not a valid value for Colors"
+
+    with pytest.raises(ValueError) as e:
+        Color.validate_many(['yelow'])
+    assert str(e.value) == "yelow is not a valid value for Color"
+
+
+def test_encode_decode():
+    codes = MyTokens.encode([MyTokens.baz, MyTokens.foo, MyTokens.baz, MyTokens.bar])
+    assert codes.typecode == 'B'
+    assert codes.tolist() == [2, 0, 2, 1]
+    assert MyTokens.decode(codes) == [MyTokens.baz, MyTokens.foo, MyTokens.baz, MyTokens.bar]
+    assert MyTokens.decode([1]) == [MyTokens.bar]
+
+    equal_to_foo = MyToken(name='foo')
+    assert MyTokens.encode(iter([MyTokens.bar, equal_to_foo])).tolist() == [1, 0]
+    assert MyTokens.ordinal(MyTokens.baz) == 2
+
+    class MoreTokens(MyTokens):
+        boink = MyToken()
+
+    assert MoreTokens.encode([MoreTokens.boink, MyTokens.foo]).tolist() == [3, 0]
+
+    with pytest.raises(ValueError) as e:
+        MyTokens.encode([MyTokens.foo, MoreTokens.boink])
+    assert str(e.value) == '<MyToken: boink> is not a member of MyTokens'
+
+    for codes in ([3], [-1]):
+        with pytest.raises(ValueError) as e:
+            MyTokens.decode(codes)
+        assert str(e.value) == 'Invalid codes for MyTokens'
+
+
+def test_encode_many_tokens():
+    many_tokens = TokenContainerMeta('ManyTokens', (TokenContainer, ), {f'token_{i}': MyToken() for i in range(300)})
+    codes = many_tokens.encode(many_tokens)
+    assert codes.typecode == 'H'
+    assert many_tokens.decode(codes) == list(many_tokens)
+
+
+def test_hash_and_equality_of_container_tokens():
+    assert MyTokens.foo._hash == hash((('name', 'foo'), ('stuff', 'Hello')))
+    assert MyTokens.foo == MyTokens.foo
+    assert MyTokens.foo != MyTokens.bar
+
+    free_standing = MyToken(name='foo', stuff='Hello')
+    assert free_standing == MyTokens.foo
+    assert MyTokens.foo == free_standing
+    assert hash(free_standing) == hash(MyTokens.foo)
+    assert free_standing in {MyTokens.foo}
+    assert MyTokens.foo in {free_standing}
+    assert {MyTokens.foo: 1}[free_standing] == 1
+    assert hash(free_standing) == hash(MyToken(name='foo', stuff='Hello'))
+    assert hash(free_standing) != hash(MyToken(name='foo', stuff='Goodbye'))
+
+    class SameNameTokens(TokenContainer):
+        foo = MyToken(stuff='Hello')
+
+    unpickled = pickle.loads(pickle.dumps(SameNameTokens.foo))
+    assert unpickled is not SameNameTokens.foo
+    assert hash(unpickled) == hash(SameNameTokens.foo)
+    assert {SameNameTokens.foo: 1}[unpickled] == 1
+
+    assert unpickled in {SameNameTokens.foo}
+
+    assert SameNameTokens.foo != MyTokens.foo
+    assert len({SameNameTokens.foo, MyTokens.foo}) == 2
+
+
+def test_lazy_derived_attributes():
+    calls = []
+
+    def titled(name, **_):
+        calls.append(name)
+        return name.title()
+
+    class LazyToken(Token):
+        name = TokenAttribute()
+        label = TokenAttribute(value=titled)
+        shout = TokenAttribute(optional_value=lambda label, **_: label.upper())
+
+    class LazyCompactToken(LazyToken):
+        __compact__ = True
+
+    class LazyTokens(TokenContainer):
+        class Meta:
+            lazy_derived_attributes = True
+
+        foo = LazyToken(shout=PRESENT)
+        bar = LazyToken(label='Explicit')
+        baz = LazyCompactToken()
+
+    assert calls == []
+    foo_hash = hash(LazyTokens.foo)
+
+    assert LazyTokens.foo.shout == 'FOO'
+    assert calls == ['foo']
+    assert LazyTokens.foo.label == 'Foo'
+    assert calls == ['foo']
+    assert hash(LazyTokens.foo) == foo_hash
+
+    assert LazyTokens.bar.label == 'Explicit'
+    assert LazyTokens.bar.shout is None
+    assert calls == ['foo']
+
+    assert LazyTokens.baz.label == 'Baz'
+    assert calls == ['foo', 'baz']
+
+    with pytest.raises(TypeError):
+        LazyTokens.foo.label = 'Not likely'
+
+    with pytest.raises(AttributeError) as e:
+        LazyTokens.foo.no_such_attribute
+    assert str(e.value) == "'LazyToken' object has no attribute 'no_such_attribute'"
+
+    class MoreLazyTokens(LazyTokens):
+        boink = LazyToken()
+
+    assert calls == ['foo', 'baz']
+
+    class EagerTokens(MoreLazyTokens):
+        class Meta:
+            lazy_derived_attributes = False
+
+    assert calls == ['foo', 'baz', 'boink']
+    assert EagerTokens.boink.label == 'Boink'
+
+
+def test_token_set():
+    foo_baz = TokenSet(MyTokens, [MyTokens.baz, MyTokens.foo, MyTokens.baz])
+    bar_baz = TokenSet(MyTokens, [MyTokens.bar, MyTokens.baz])
+
+    assert list(foo_baz) == [MyTokens.foo, MyTokens.baz]
+    assert len(foo_baz) == 2
+    assert foo_baz.mask == 0b101
+    assert repr(foo_baz) == 'TokenSet(MyTokens, [foo, baz])'
+    assert MyTokens.foo in foo_baz
+    assert MyTokens.bar not in foo_baz
+    assert MyToken(name='foo') in foo_baz
+    assert 'foo' not in foo_baz
+    assert not TokenSet(MyTokens)
+
+    assert list(foo_baz | bar_baz) == list(MyTokens)
+    assert list(foo_baz & bar_baz) == [MyTokens.baz]
+    assert list(foo_baz - bar_baz) == [MyTokens.foo]
+    assert list(foo_baz ^ bar_baz) == [MyTokens.foo, MyTokens.bar]
+    assert TokenSet(MyTokens, [MyTokens.baz]) < foo_baz
+    assert not foo_baz <= bar_baz
+    assert foo_baz >= foo_baz
+    assert not foo_baz.isdisjoint(bar_baz)
+
+    assert foo_baz == {MyTokens.foo, MyTokens.baz}
+    assert frozenset([MyTokens.foo, MyTokens.baz]) == foo_baz
+    assert hash(foo_baz) == hash(frozenset(foo_baz))
+    assert {foo_baz: 1}[frozenset(foo_baz)] == 1
+    assert foo_baz | {MyTokens.bar} == TokenSet(MyTokens, MyTokens)
+    assert {MyTokens.bar} | foo_baz == TokenSet(MyTokens, MyTokens)
+    assert list({MyTokens.foo, MyTokens.bar} & foo_baz) == [MyTokens.foo]
+    assert {MyTokens.foo} <= foo_baz
+
+    class OtherTokens(TokenContainer):
+        boink = MyToken()
+
+    assert OtherTokens.boink not in foo_baz
+    assert foo_baz & {OtherTokens.boink} == TokenSet(MyTokens)
+    with pytest.raises(ValueError):
+        foo_baz | {OtherTokens.boink}
+    with pytest.raises(ValueError):
+        TokenSet(MyTokens, [OtherTokens.boink])
+
+    assert TokenSet.from_mask(MyTokens, 0b110) == bar_baz
+    with pytest.raises(ValueError) as e:
+        TokenSet.from_mask(MyTokens, 0b1000)
+    assert str(e.value) == 'Invalid mask for MyTokens'
+
+    pickled = pickle.dumps(foo_baz, pickle.HIGHEST_PROTOCOL)
+    assert pickle.loads(pickled) == foo_baz
+    assert len(pickled) < len(pickle.dumps(frozenset(foo_baz), pickle.HIGHEST_PROTOCOL))
+
+    # Few tokens of a large container are found by their set bits, many by flags per ordinal
+    many_tokens = TokenContainerMeta('ManyTokens', (TokenContainer, ), {f'token_{i}': MyToken() for i in range(300)})
+    tokens = list(many_tokens)
+    for chosen in [tokens[3:300:100], tokens[::2], tokens[299:], []]:
+        token_set = TokenSet(many_tokens, reversed(chosen))
+        assert list(token_set) == chosen
+        assert list(token_set) == chosen
+        assert len(token_set) == len(chosen)
+        assert all(token in token_set for token in chosen)
+        assert sum(token in token_set for token in tokens) == len(chosen)
+
+
+def test_token_map():
+    counts = TokenMap(MyTokens, {MyTokens.baz: 1})
+    counts[MyTokens.foo] = 2
+    counts[MyTokens.baz] += 1
+
+    assert list(counts) == [MyTokens.foo, MyTokens.baz]
+    assert list(counts.items()) == [(MyTokens.foo, 2), (MyTokens.baz, 2)]
+    assert list(counts.values()) == [2, 2]
+    assert (MyTokens.baz, 2) in counts.items()
+    assert len(counts) == 2
+    assert counts == {MyTokens.baz: 2, MyTokens.foo: 2}
+    assert counts[MyToken(name='foo')] == 2
+    assert MyTokens.bar not in counts
+    assert 'foo' not in counts
+    assert counts.get(MyTokens.bar) is None
+    assert repr(counts) == 'TokenMap(MyTokens, {foo: 2, baz: 2})'
+
+    with pytest.raises(KeyError):
+        counts[MyTokens.bar]
+
+    class OtherTokens(TokenContainer):
+        boink = MyToken()
+
+    with pytest.raises(KeyError):
+        counts[OtherTokens.boink] = 1
+
+    # Tokens of a base container, at another ordinal in this one
+    class CombinedTokens(OtherTokens, MyTokens):
+        pass
+
+    combined = TokenMap(CombinedTokens, {token: token.name for token in CombinedTokens})
+    assert [CombinedTokens.ordinal(token) for token in MyTokens] != [MyTokens.ordinal(token) for token in MyTokens]
+    assert [combined[token] for token in MyTokens] == ['foo', 'bar', 'baz']
+    assert list(combined.items()) == [(token, token.name) for token in CombinedTokens]
+    assert len(combined) == 4
+    del combined[MyTokens.bar]
+    assert list(combined) == [token for token in CombinedTokens if token is not MyTokens.bar]
+    assert len(combined) == 3
+    with pytest.raises(KeyError):
+        TokenMap(MyTokens)[OtherTokens.boink]
+
+    copied = counts.copy()
+    del counts[MyTokens.foo]
+    assert counts == {MyTokens.baz: 2}
+    assert copied == {MyTokens.baz: 2, MyTokens.foo: 2}
+    with pytest.raises(KeyError):
+        del counts[MyTokens.foo]
+
+    assert pickle.loads(pickle.dumps(copied, pickle.HIGHEST_PROTOCOL)) == copied
+    copied.clear()
+    assert len(copied) == 0
+
+    with pytest.raises(TypeError):
+        copied.array
+
+
+def test_profiling():
+    assert get_profile() is None
+
+    class ProfiledToken(Token):
+        label = TokenAttribute(value=lambda name, **_: name.title())
+        home = TokenAttribute(optional_value=lambda name, **_: name.upper())
+
+    profile = enable_profiling()
+    try:
+        assert get_profile() is profile
+
+        class ProfiledTokens(TokenContainer):
+            foo = ProfiledToken(home=PRESENT)
+            bar = ProfiledToken()
+
+        ProfiledToken.validate_many(['foo', 'bar', 'foo'])
+        ProfiledTokens._validate('foo')
+    finally:
+        assert disable_profiling() is profile
+    assert get_profile() is None
+
+    ProfiledTokens._validate('bar')
+
+    [container_profile] = profile.containers
+    assert container_profile.name == 'tests.test_tokens.test_profiling.<locals>.ProfiledTokens'
+    assert container_profile.tokens == 2
+    assert container_profile.seconds > container_profile.derivation_seconds > 0
+    assert {key: call_profile.calls for key, call_profile in profile.derivations.items()} == {
+        'ProfiledToken.label': 2,
+        'ProfiledToken.home': 1,
+    }
+    assert {key: call_profile.calls for key, call_profile in profile.validations.items()} == {
+        'ProfiledToken': 2,
+        'ProfiledTokens': 1,
+    }
+
+    report = profile.report()
+    assert 'tests.test_tokens.test_profiling.<locals>.ProfiledTokens' in report
+    assert 'ProfiledToken.label' in report
+
+
+class RecordToken(Token):
+    prefix = TokenAttribute()
+    code = TokenAttribute()
+    label = TokenAttribute(value=lambda name, prefix, **_: f'{prefix}:{name}')
+    home = TokenAttribute(optional_value=lambda name, **_: None if name == 'bar' else name.upper())
+
+
+def test_from_records():
+    RecordTokens = TokenContainer.from_records('RecordTokens', RecordToken, [
+        dict(name='foo', code=1, home=PRESENT),
+        dict(name='bar', code=None, home=PRESENT),
+    ], meta=dict(prefix='rec'))
+
+    assert RecordTokens.__name__ == 'RecordTokens'
+    assert RecordTokens.__module__ == 'tests.test_tokens'
+    assert issubclass(RecordTokens, TokenContainer)
+    assert [(t.name, t.code, t.label, t.home) for t in RecordTokens] == [
+        ('foo', 1, 'rec:foo', 'FOO'),
+        ('bar', None, 'rec:bar', PRESENT),
+    ]
+    assert str(RecordTokens.foo) == 'rec.foo'
+
+    with pytest.raises(ValueError) as e:
+        TokenContainer.from_records('RecordTokens', RecordToken, [dict(name='foo'), dict(name='foo', code=2)])
+    assert str(e.value) == "Duplicate token name 'foo' in the records of RecordTokens"
+
+    with pytest.raises(ValueError) as e:
+        TokenContainer.from_records('RecordTokens', RecordToken, [dict(name='foo'), dict(code=2)])
+    assert str(e.value) == "Record 1 of RecordTokens has no name: {'code': 2}"
+
+    with pytest.raises(ValueError) as e:
+        TokenContainer.from_records('RecordTokens', RecordToken, [dict(name=None, code=2)])
+    assert str(e.value) == "Record 0 of RecordTokens has no name: {'name': None, 'code': 2}"
+
+
+def test_from_csv_and_json_with_cache(tmp_path):
+    derived = []
+
+    class CachedToken(Token):
+        prefix = TokenAttribute()
+        code = TokenAttribute()
+        label = TokenAttribute(value=lambda name, **_: derived.append(name) or name.title())
+
+    (tmp_path / 'tokens.csv').write_text('name,code\nfoo,1\nbar,\n')
+    (tmp_path / 'tokens.json').write_text('[{"name": "foo", "code": 1}, {"name": "bar"}]')
+    cache_dir = tmp_path / 'cache'
+
+    def load():
+        return [
+            TokenContainer.from_csv('CsvTokens', CachedToken, tmp_path / 'tokens.csv', cache_dir=cache_dir),
+            TokenContainer.from_json('JsonTokens', CachedToken, tmp_path / 'tokens.json', cache_dir=cache_dir),
+        ]
+
+    cold = load()
+    assert derived == ['foo', 'bar'] * 2
+    assert len(list(cache_dir.iterdir())) == 2
+
+    warm = load()
+    assert derived == ['foo', 'bar'] * 2
+    for cold_container, warm_container in zip(cold, warm):
+        assert [token.__getstate__()[0] for token in warm_container] == [token.__getstate__()[0] for token in cold_container]
+        assert warm_container.bar is not cold_container.bar
+        assert warm_container.ordinal(warm_container.bar) == 1
+    assert [(t.name, t.code, t.label, t.prefix) for t in warm[0]] == [('foo', '1', 'Foo', None), ('bar', None, 'Bar', None)]
+    assert [t.code for t in warm[1]] == [1, None]
+
+    # A changed source, or another prefix, is not found in the cache
+    (tmp_path / 'tokens.csv').write_text('name,code\nfoo,1\nbar,2\n')
+    assert TokenContainer.from_csv('CsvTokens', CachedToken, tmp_path / 'tokens.csv', cache_dir=cache_dir).bar.code == '2'
+    TokenContainer.from_json('JsonTokens', CachedToken, tmp_path / 'tokens.json', meta=dict(prefix='x'), cache_dir=cache_dir)
+    assert derived == ['foo', 'bar'] * 4
+
+
+def token_state(token):
+    state = dict(getattr(token, '__dict__', {}))
+    for klass in type(token).__mro__:
+        for slot in klass.__dict__.get('__slots__', ()):
+            state[slot] = getattr(token, slot, None)
+    return state
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Needs os.fork')
+def test_nothing_is_written_to_frozen_tokens():
+    class FrozenToken(Token):
+        prefix = TokenAttribute()
+        label = TokenAttribute(value=lambda name, **_: name.title())
+        home = TokenAttribute(optional_value=lambda **_: None)
+
+    class CompactFrozenToken(FrozenToken):
+        __compact__ = True
+
+    class FrozenTokens(TokenContainer):
+        class Meta:
+            prefix = 'frozen'
+
+        foo = FrozenToken(home=PRESENT)
+        bar = CompactFrozenToken()
+
+    class LazyFrozenTokens(FrozenTokens):
+        class Meta:
+            lazy_derived_attributes = True
+
+        baz = FrozenToken()
+
+    assert not LazyFrozenTokens.baz._frozen
+    assert LazyFrozenTokens.baz.label == 'Baz'
+    tokens = list(LazyFrozenTokens)
+    assert all(token._frozen for token in tokens)
+    states = [token_state(token) for token in tokens]
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        ok = False
+        try:
+            for token in tokens:
+                hash(token), str(token), repr(token), dict(token.__getstate__()[0])
+                token == LazyFrozenTokens[token.name], token in FrozenTokens, LazyFrozenTokens.ordinal(token)
+            LazyFrozenTokens.resolve('frozen.foo'), FrozenToken.validate_many(['foo', 'bar'])
+            TokenSet(LazyFrozenTokens, tokens)
+
+            class MoreFrozenTokens(LazyFrozenTokens):
+                boink = FrozenToken()
+
+            ok = [token_state(token) for token in tokens] == states
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    assert repr(FrozenTokens.foo) == '<FrozenToken: frozen.foo>'
+    assert str(FrozenTokens.bar) == 'frozen.bar'
@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+
+from tri_token import (
+    TokenContainer,
+    TokenMap,
+)
+
+from tests.test_tokens import (
+    MyToken,
+    MyTokens,
+)
+
+numpy = pytest.importorskip('numpy')
+
+
+def test_validate_many_string_array():
+    result = MyToken.validate_many(numpy.array([['foo', 'bar'], ['foo', 'baz']]))
+    assert result.dtype == object
+    assert result.tolist() == [[MyTokens.foo, MyTokens.bar], [MyTokens.foo, MyTokens.baz]]
+
+
+def test_validate_many_object_array():
+    result = MyTokens.validate_many(numpy.array(['foo', MyTokens.bar, None], dtype=object)[:2])
+    assert result.tolist() == [MyTokens.foo, MyTokens.bar]
+
+    with pytest.raises(ValueError) as e:
+        MyTokens.validate_many(numpy.array(['foo', 'nope']))
+    assert str(e.value) == 'nope is not a valid value for MyTokens'
+
+
+def test_encode_decode_arrays():
+    tokens = numpy.array([[MyTokens.bar, MyTokens.foo], [MyTokens.baz, MyTokens.bar]], dtype=object)
+    codes = MyTokens.encode(tokens)
+    assert codes.dtype == numpy.uint8
+    assert codes.tolist() == [[1, 0], [2, 1]]
+
+    decoded = MyTokens.decode(codes)
+    assert decoded.dtype == object
+    assert decoded.tolist() == tokens.tolist()
+
+    with pytest.raises(ValueError):
+        MyTokens.decode(numpy.array([0, 3]))
+
+
+def test_to_columns_as_numpy():
+    class DocumentedTokens(MyTokens):
+        foo = MyToken(__override__=True, stuff=None)
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+    columns = DocumentedTokens.to_columns(as_numpy=True)
+    assert columns['name'].dtype.kind == 'U'
+    assert columns['name'].tolist() == ['foo', 'bar', 'baz']
+    assert columns['stuff'].dtype == object
+    assert columns['stuff'].tolist() == [None, 'World', '']
+
+
+def test_to_columns_as_numpy_with_tuples():
+    class TupleTokens(TokenContainer):
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+        foo = MyToken(stuff=(1, 2))
+        bar = MyToken(stuff=(3, 4))
+
+    stuff = TupleTokens.to_columns(as_numpy=True)['stuff']
+    assert stuff.shape == (2,)
+    assert stuff.dtype == object
+    assert stuff.tolist() == [(1, 2), (3, 4)]
+
+
+def test_token_map_with_dtype():
+    counts = TokenMap(MyTokens, {MyTokens.bar: 2}, dtype='int32')
+    counts[MyTokens.bar] += 1
+    counts.array[:] += 1
+
+    assert counts.array.dtype == numpy.int32
+    assert dict(counts) == {MyTokens.foo: 1, MyTokens.bar: 4, MyTokens.baz: 1}
+    assert len(counts) == 3
+    assert MyTokens.foo in counts
+
+    with pytest.raises(TypeError):
+        del counts[MyTokens.foo]
+
+    unpickled = pickle.loads(pickle.dumps(counts, pickle.HIGHEST_PROTOCOL))
+    assert unpickled.array.tolist() == [1, 4, 1]
+    assert TokenMap(MyTokens, dtype=float, fill=0.5).array.tolist() == [0.5, 0.5, 0.5]
@@ -0,0 +1,69 @@
+import pytest
+
+from tri_token import (
+    PRESENT,
+    TokenAttribute,
+    TokenContainer,
+)
+
+from tests.test_tokens import (
+    MyToken,
+    MyTokens,
+)
+
+pyarrow = pytest.importorskip('pyarrow')
+
+
+class DocumentedTokens(MyTokens):
+    class Meta:
+        documentation_columns = ['name', 'stuff']
+        documentation_sort_key = lambda token: token.name
+
+
+def test_to_arrow():
+    class RepeatedTokens(MyTokens):
+        boink = MyToken(stuff='Hello')
+
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+    table = RepeatedTokens.to_arrow()
+    assert table.column_names == ['name', 'stuff']
+    assert table.to_pydict() == {'name': ['foo', 'bar', 'baz', 'boink'], 'stuff': ['Hello', 'World', '', 'Hello']}
+    assert pyarrow.types.is_string(table.schema.field('name').type)
+    assert pyarrow.types.is_dictionary(table.schema.field('stuff').type)
+
+
+def test_write_parquet(tmp_path):
+    from pyarrow.parquet import read_table
+
+    DocumentedTokens.write_parquet(tmp_path / 'tokens.parquet')
+    assert read_table(tmp_path / 'tokens.parquet').to_pydict() == {'name': ['bar', 'baz', 'foo'], 'stuff': ['World', '', 'Hello']}
+
+
+def test_to_arrow_with_present():
+    class HomeToken(MyToken):
+        home = TokenAttribute(optional_value=lambda **_: None)
+
+    class HomeTokens(TokenContainer):
+        class Meta:
+            documentation_columns = ['name', 'home']
+
+        foo = HomeToken(home=PRESENT)
+        bar = HomeToken(home='Batcave')
+
+    assert HomeTokens.foo.home is PRESENT
+    assert HomeTokens.to_arrow().to_pydict() == {'name': ['foo', 'bar'], 'home': [None, 'Batcave']}
+
+
+def test_to_arrow_with_mixed_types():
+    class MixedTokens(TokenContainer):
+        class Meta:
+            documentation_columns = ['name', 'stuff']
+
+        foo = MyToken(stuff=1)
+        bar = MyToken(stuff='World')
+
+    with pytest.raises(TypeError) as e:
+        MixedTokens.to_arrow()
+    assert str(e.value).startswith('Column stuff of MixedTokens can not be converted to pyarrow: ')
@@ -1,3 +1,6 @@
+import re
+import warnings
+
 import pydantic
 import pytest
 from pydantic import (
@@ -9,6 +12,7 @@ from tri_token import (
     Token,
     TokenAttribute,
     TokenContainer,
+    TokenContainerMeta,
 )
 
 
@@ -31,6 +35,7 @@ def test_token_class_something_something():
     assert MyModelDirectly(thing=MyTokens.foo).thing == MyTokens.foo
 
 
+@pytest.mark.skipif(not pydantic.VERSION.startswith('1.'), reason='pydantic v2 reports its own type errors')
 def test_token_class_rejects_invalid_values():
     with pytest.raises(ValidationError) as e:
         MyModelDirectly(thing=5)
@@ -59,6 +64,34 @@ def test_token_class_coersion_conflict():
     assert str(e.value) == 'Non-unique names: foo'
 
 
+def test_token_class_coersion_with_container_inheritance():
+    class InheritedToken(Token):
+        pass
+
+    class BaseTokenContainer(TokenContainer):
+        foo = InheritedToken()
+
+    class InheritingTokenContainer(BaseTokenContainer):
+        bar = InheritedToken()
+
+    @pydantic.dataclasses.dataclass
+    class MyModelWithInheritance:
+        thing: InheritedToken
+
+    assert MyModelWithInheritance(thing='foo').thing is BaseTokenContainer.foo
+    assert MyModelWithInheritance(thing='bar').thing is InheritingTokenContainer.bar
+
+    class OverridingTokenContainer(BaseTokenContainer):
+        foo = InheritedToken(__override__=True)
+
+    with pytest.raises(TypeError) as e:
+        @pydantic.dataclasses.dataclass
+        class MyModelWithOverride:
+            thing: InheritedToken
+
+    assert str(e.value) == 'Non-unique names: foo'
+
+
 def test_token_class_cant_coerce_badness():
     with pytest.raises(ValidationError) as e:
         MyModelDirectly(thing="badness")
@@ -68,7 +101,7 @@ def test_token_class_cant_coerce_badness():
 def test_a_useful_schema_is_generated():
     expected = {
         "title": "Thing",
-        "pattern": "^foo|bar|baz$",
+        "pattern": "^(?:foo|ba[rz])$",
         "examples": ["foo", "bar", "baz"],
         "type": "string"
     }
@@ -79,6 +112,59 @@ def test_a_useful_schema_is_generated():
     assert SomeModel.schema()['properties']['thing'] == expected
 
 
+def test_schema_is_cached_until_a_container_is_registered():
+    class SchemaToken(Token):
+        pass
+
+    class SchemaTokens(TokenContainer):
+        apple = SchemaToken()
+        apricot = SchemaToken()
+
+    class SomeModel(BaseModel):
+        thing: SchemaToken
+
+    assert SomeModel.schema()['properties']['thing']['pattern'] == '^ap(?:ple|ricot)$'
+
+    class MoreSchemaTokens(SchemaTokens):
+        banana = SchemaToken()
+
+    class OtherModel(BaseModel):
+        thing: SchemaToken
+
+    assert OtherModel.schema()['properties']['thing']['pattern'] == '^(?:ap(?:ple|ricot)|banana)$'
+    assert OtherModel.schema()['properties']['thing']['examples'] == ['apple', 'apricot', 'banana']
+
+
+def test_changing_a_generated_schema_leaves_the_cache_alone():
+    class SomeModel(BaseModel):
+        thing: MyToken
+
+    class OtherModel(BaseModel):
+        thing: MyToken
+
+    SomeModel.schema()['properties']['thing']['examples'].append('changed')
+    assert OtherModel.schema()['properties']['thing']['examples'] == ['foo', 'bar', 'baz']
+
+
+def test_schema_pattern_escapes_brackets_in_character_classes():
+    class BracketToken(Token):
+        pass
+
+    TokenContainerMeta('BracketTokens', (TokenContainer, ), {'a[': BracketToken(), 'ab': BracketToken()})
+
+    class SomeModel(BaseModel):
+        thing: BracketToken
+
+    pattern = SomeModel.schema()['properties']['thing']['pattern']
+    assert pattern == '^a[\\[b]$'
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        compiled = re.compile(pattern)
+    assert compiled.match('a[')
+    assert compiled.match('ab')
+    assert not compiled.match('a]')
+
+
 def test_accidentally_using_the_container_type_directly_produces_a_helpful_error():
     with pytest.raises(Exception) as error:
         class MyBrokenModel(BaseModel):
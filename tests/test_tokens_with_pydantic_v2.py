@@ -0,0 +1,104 @@
+import pydantic
+import pytest
+
+if pydantic.VERSION.startswith('1.'):
+    pytest.skip('pydantic v2 only', allow_module_level=True)
+
+from pydantic import (  # noqa: E402
+    BaseModel,
+    ValidationError,
+)
+
+from tests.test_tokens_with_pydantic import (  # noqa: E402
+    MyToken,
+    MyTokens,
+)
+from tri_token import (  # noqa: E402
+    Token,
+    TokenContainer,
+)
+
+
+class MyModel(BaseModel):
+    thing: MyToken
+
+
+def test_coerce_names_and_tokens():
+    assert MyModel(thing='foo').thing is MyTokens.foo
+    assert MyModel(thing=MyTokens.bar).thing is MyTokens.bar
+    assert MyModel.model_validate_json('{"thing": "baz"}').thing is MyTokens.baz
+
+
+def test_serialize_to_names():
+    model = MyModel(thing=MyTokens.foo)
+    assert model.model_dump() == {'thing': MyTokens.foo}
+    assert model.model_dump_json() == '{"thing":"foo"}'
+
+
+def test_invalid_values():
+    with pytest.raises(ValidationError) as e:
+        MyModel(thing='fooo')
+    assert 'fooo is not a valid value for MyToken' in str(e.value)
+
+    with pytest.raises(ValidationError) as e:
+        MyModel.model_validate_json('{"thing": 5}')
+    assert 'Input should be a valid string' in str(e.value)
+
+    with pytest.raises(ValidationError) as e:
+        MyModel(thing=[5])
+    assert 'Input should be an instance of MyToken' in str(e.value)
+
+
+def test_containers_registered_after_the_model():
+    class LateToken(Token):
+        pass
+
+    class LateTokens(TokenContainer):
+        foo = LateToken()
+
+    class LateModel(BaseModel):
+        thing: LateToken
+
+    class LaterTokens(LateTokens):
+        bar = LateToken()
+
+    assert LateModel(thing='bar').thing is LaterTokens.bar
+    assert LateModel.model_json_schema()['properties']['thing']['examples'] == ['foo', 'bar']
+
+
+def test_json_schema():
+    assert MyModel.model_json_schema()['properties']['thing'] == {
+        "title": "Thing",
+        "pattern": "^(?:foo|ba[rz])$",
+        "examples": ["foo", "bar", "baz"],
+        "type": "string"
+    }
+
+
+def test_changing_a_generated_schema_leaves_the_cache_alone():
+    MyToken.__get_pydantic_json_schema__(None, None)['examples'].append('changed')
+    assert MyModel.model_json_schema()['properties']['thing']['examples'] == ['foo', 'bar', 'baz']
+
+
+def test_coercion_conflict():
+    class TheToken(Token):
+        pass
+
+    class OneTokenContainer(TokenContainer):
+        foo = TheToken()
+
+    class AnotherTokenContainer(TokenContainer):
+        foo = TheToken()
+
+    with pytest.raises(TypeError) as e:
+        class ConflictingModel(BaseModel):
+            thing: TheToken
+
+    assert str(e.value) == 'Non-unique names: foo'
+
+
+def test_using_the_container_type_directly_produces_a_helpful_error():
+    with pytest.raises(Exception) as e:
+        class MyBrokenModel(BaseModel):
+            thing: MyTokens
+    assert str(e.value) == 'MyTokens cannot be used as a type in pydantic. Use the class of the instances instead'
@@ -0,0 +1,60 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+
+from tri_token import (
+    Token,
+    TokenAttribute,
+    TokenContainer,
+    TokenContainerMeta,
+)
+
+
+class ThreadedToken(Token):
+    number = TokenAttribute()
+    label = TokenAttribute(value=lambda name, number, **_: f'{name}:{number}')
+
+
+@pytest.fixture
+def frequent_thread_switches():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_concurrent_container_creation(frequent_thread_switches):
+    thread_count = 8
+    containers_per_thread = 25
+    tokens_per_container = 20
+    barrier = Barrier(thread_count)
+
+    def define_containers(thread):
+        barrier.wait()
+        containers = []
+        for c in range(containers_per_thread):
+            containers.append(TokenContainerMeta(f'Container_{thread}_{c}', (TokenContainer, ), {
+                f'token_{thread}_{c}_{i}': ThreadedToken(number=i)
+                for i in range(tokens_per_container)
+            }))
+            # Read while other threads keep defining containers
+            assert ThreadedToken._validate(f'token_{thread}_{c}_0') is containers[-1][f'token_{thread}_{c}_0']
+        return containers
+
+    with ThreadPoolExecutor(thread_count) as executor:
+        containers = [c for cs in executor.map(define_containers, range(thread_count)) for c in cs]
+
+    tokens = [token for container in containers for token in container]
+    assert len(tokens) == thread_count * containers_per_thread * tokens_per_container
+    assert len({token._index for token in tokens}) == len(tokens)
+
+    for container in containers:
+        indices = [token._index for token in container]
+        assert indices == list(range(indices[0], indices[0] + tokens_per_container))
+        assert [token.number for token in container] == list(range(tokens_per_container))
+        assert all(token.label == f'{token.name}:{token.number}' for token in container)
+
+    assert all(ThreadedToken._validate(token.name) is token for token in tokens)
+    assert not ThreadedToken._conflicting_names